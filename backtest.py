@@ -0,0 +1,67 @@
+import numpy as np
+
+from divergence_detector import BarArrays, _float_column, _macd_column, _macd_zones, detect_divergence_batch
+
+
+def walk_forward_signals(df, presets=('def', 'low1'), check_for="Bearish_Divergence", limit_zones=7,
+                         start=0, chunk=262144):
+    """
+    What check_divergence would have returned at every bar, without lookahead.
+    df: DataFrame or BarArrays.
+
+    Row t holds the Divergence flags of check_divergence(df.iloc[:t + 1]) for each preset, in an
+    int64 'signal_<preset>' column. The zones are segmented once; at bar t the zone table is
+    the finished zones before t plus the open zone with its running (prefix) extremes, and
+    all bars are evaluated together with detect_divergence_batch, so the total cost is linear
+    in the number of bars. Rows before `start` are left at 0; `chunk` bounds the memory of
+    the stacked zone tables.
+    """
+    signals = {}
+    for preset in presets:
+        flags = np.zeros(len(df), dtype=np.int64)
+        if len(df):
+            flags[start:] = _walk_forward_flags(
+                _float_column(df, 'high'), _float_column(df, 'low'), _float_column(df, _macd_column(preset)),
+                check_for, int(np.floor(limit_zones)), start, chunk,
+            )
+        signals[f'signal_{preset}'] = flags
+
+    import pandas as pd
+
+    return pd.DataFrame(signals, index=None if isinstance(df, BarArrays) else df.index)
+
+
+def _walk_forward_flags(high, low, macd, check_for, zones, start, chunk):
+    n = len(macd)
+    starts, range_extreme, macd_extreme, _ = _macd_zones(high, low, macd)
+    lengths = np.diff(np.append(starts, n))
+    zone_id = np.repeat(np.arange(len(starts)), lengths)
+
+    # Running extremes inside each zone, with negative zones negated so both are maxima
+    positive = macd >= 0
+    sign = np.where(positive, 1.0, -1.0)
+    running_price = np.where(positive, high, low) * sign
+    running_macd = macd * sign
+    for begin, end in zip(starts, np.append(starts[1:], n)):
+        np.fmax.accumulate(running_price[begin:end], out=running_price[begin:end])
+        np.fmax.accumulate(running_macd[begin:end], out=running_macd[begin:end])
+    running_price *= sign
+    running_macd *= sign
+
+    flags = np.zeros(n - start, dtype=np.int64)
+    if zones < 1:
+        return flags
+    offsets = np.arange(zones - 1, 0, -1)   # closed zones, oldest column first
+    for lo in range(start, n, chunk):
+        hi = min(lo + chunk, n)
+        current = zone_id[lo:hi]
+        previous = current[:, None] - offsets[None, :]
+        valid = previous >= 0
+        previous = np.maximum(previous, 0)
+        price = np.where(valid, range_extreme[previous], np.nan)
+        macd_table = np.where(valid, macd_extreme[previous], np.nan)
+        price = np.hstack([price, running_price[lo:hi, None]])
+        macd_table = np.hstack([macd_table, running_macd[lo:hi, None]])
+        counts = np.minimum(current + 1, zones)
+        flags[lo - start:hi - start] = detect_divergence_batch(price, macd_table, check_for, counts)
+    return flags
@@ -0,0 +1,180 @@
+import json
+import os
+
+import numpy as np
+
+from divergence_detector import BarArrays, _ns
+from indicators import macd_block
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+class BarStore:
+    """
+    Append-only on-disk bar history, one memory-mapped file per symbol / timeframe.
+
+    Each <root>/<symbol>/<timeframe>.bars file is a column-major float64 block: time (int64
+    epoch ns, stored bit for bit), open, high, low, close, then macd/macdS for every preset,
+    each column filling `capacity` slots. A <timeframe>.json sidecar holds the column names,
+    row count, capacity and the EMA state at the last bar, so appended bars continue the MACD
+    series without recomputing history. Capacity doubles when full.
+
+    window() returns BarArrays whose arrays are views into the mapping, found by binary search
+    on the time column; they stay valid until the next append that grows the file.
+
+    presets: preset names, (fast, slow, signal) triples or a PresetSet; their macd/macdS
+    columns are computed from the closes on append and stored after OHLC.
+    """
+
+    def __init__(self, root, presets=("low2", "low1", "def", "high"), capacity=65536):
+        self.root = root
+        self.presets = tuple(presets)
+        self.capacity = int(capacity)
+        self._open = {}
+
+    def append(self, symbol, timeframe, bars):
+        """
+        Appends closed bars (DataFrame or BarArrays with time/open/high/low/close) and their MACD
+        columns. Bars not newer than the last stored bar are skipped.
+        Returns the number of bars written.
+        """
+        if not isinstance(bars, BarArrays):
+            bars = BarArrays.from_frame(bars, macd_columns=[])
+        entry = self._entry(symbol, timeframe, create=True)
+        meta, length = entry['meta'], entry['meta']['length']
+        if length:
+            bars = bars[int(np.searchsorted(bars.time, entry['time'][length - 1], side='right')):]
+        count = len(bars)
+        if count == 0:
+            return 0
+        if length + count > meta['capacity']:
+            entry = self._grow(symbol, timeframe, entry, length + count)
+
+        block = entry['block']
+        rows = slice(length, length + count)
+        entry['time'][rows] = bars.time
+        for k, name in enumerate(PRICE_COLUMNS, start=1):
+            block[rows, k] = getattr(bars, name)
+        state = dict(meta['state'])
+        macd, _ = macd_block(bars.close, self.presets, state=state)
+        block[rows, len(PRICE_COLUMNS) + 1:] = macd
+
+        block.flush()
+        meta['length'] = length + count
+        meta['state'] = state
+        self._write_meta(symbol, timeframe, meta)
+        return count
+
+    def window(self, symbol, timeframe, start=None, end=None):
+        """
+        Bars with start <= time <= end (either bound optional; datetime-like or int64 ns) as
+        zero-copy BarArrays, MACD columns included.
+        """
+        entry = self._entry(symbol, timeframe)
+        length = entry['meta']['length']
+        times = np.asarray(entry['time'][:length])
+        lo = 0 if start is None else int(np.searchsorted(times, _ns(start), side='left'))
+        hi = length if end is None else int(np.searchsorted(times, _ns(end), side='right'))
+        hi = max(hi, lo)
+
+        block = np.asarray(entry['block'])
+        bars = object.__new__(BarArrays)
+        bars.time = times[lo:hi]
+        for k, name in enumerate(PRICE_COLUMNS, start=1):
+            setattr(bars, name, block[lo:hi, k])
+        columns = entry['meta']['columns']
+        bars.macd = {name: block[lo:hi, k] for k, name in enumerate(columns) if name.startswith(('macd_', 'macdS_'))}
+        return bars
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+    def length(self, symbol, timeframe):
+        return self._entry(symbol, timeframe)['meta']['length']
+
+    def keys(self):
+        """
+        (symbol, timeframe) pairs present on disk.
+        """
+        if not os.path.isdir(self.root):
+            return
+        for symbol in sorted(os.listdir(self.root)):
+            folder = os.path.join(self.root, symbol)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.endswith('.json'):
+                    yield symbol, name[:-len('.json')]
+
+    def close(self):
+        for entry in self._open.values():
+            entry['block'].flush()
+        self._open.clear()
+
+    def _entry(self, symbol, timeframe, create=False):
+        key = (str(symbol), str(timeframe))
+        if key in self._open:
+            return self._open[key]
+        meta_path, data_path = self._paths(*key)
+        if os.path.exists(meta_path):
+            with open(meta_path) as handle:
+                meta = json.load(handle)
+        elif create:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            _, macd_columns = macd_block(np.empty(0), self.presets)
+            meta = {'columns': ['time', *PRICE_COLUMNS, *macd_columns], 'length': 0,
+                    'capacity': self.capacity, 'state': {}}
+            _allocate(data_path, meta['capacity'] * len(meta['columns']))
+            self._write_meta(*key, meta)
+        else:
+            raise KeyError(f"No bars stored for {key[0]} {key[1]}")
+        entry = self._map(data_path, meta)
+        self._open[key] = entry
+        return entry
+
+    def _grow(self, symbol, timeframe, entry, needed):
+        """
+        Doubles the capacity in place: the file is extended and every column is moved to its
+        new offset, last column first so no column overwrites one not yet moved.
+        """
+        meta = entry['meta']
+        old, new = meta['capacity'], meta['capacity']
+        while new < needed:
+            new *= 2
+        length, width = meta['length'], len(meta['columns'])
+        entry['block'].flush()
+        del entry['block'], entry['time']
+        _, data_path = self._paths(str(symbol), str(timeframe))
+        _allocate(data_path, new * width)
+        flat = np.memmap(data_path, dtype=np.float64, mode='r+', shape=(new * width,))
+        for k in range(width - 1, 0, -1):
+            flat[k * new:k * new + length] = flat[k * old:k * old + length].copy()
+        flat.flush()
+        del flat
+        meta['capacity'] = new
+        self._write_meta(symbol, timeframe, meta)
+        entry = self._map(data_path, meta)
+        self._open[(str(symbol), str(timeframe))] = entry
+        return entry
+
+    def _map(self, data_path, meta):
+        block = np.memmap(data_path, dtype=np.float64, mode='r+', order='F',
+                          shape=(meta['capacity'], len(meta['columns'])))
+        return {'meta': meta, 'block': block, 'time': block[:, 0].view(np.int64)}
+
+    def _paths(self, symbol, timeframe):
+        folder = os.path.join(self.root, symbol)
+        return os.path.join(folder, f'{timeframe}.json'), os.path.join(folder, f'{timeframe}.bars')
+
+    def _write_meta(self, symbol, timeframe, meta):
+        meta_path, _ = self._paths(str(symbol), str(timeframe))
+        temp = meta_path + '.tmp'
+        with open(temp, 'w') as handle:
+            json.dump(meta, handle)
+        os.replace(temp, meta_path)
+
+
+def _allocate(path, values):
+    with open(path, 'ab') as handle:
+        handle.truncate(values * 8)
+
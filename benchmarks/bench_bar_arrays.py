@@ -0,0 +1,54 @@
+"""
+Peak memory and time of check_divergence_conditions on DataFrames (original per-call copy,
+current DataFrame path) versus BarArrays, over a small universe. Verdicts must agree.
+
+    python benchmarks/bench_bar_arrays.py [--symbols 3] [--bars 5000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from common import synthetic_frame
+import divergence_detector as dd
+import reference
+
+
+def reference_conditions(df, lower_df):
+    for frame in (df, lower_df):
+        for preset in ('def', 'low1'):
+            zones = reference.calculate_macd_ranges(frame, preset, 7)
+            if reference.detect_divergence(zones, "Bearish_Divergence") in (
+                    "Bearish Regular Divergence", "Bearish Regular Divergence and Bullish Hidden Divergence"):
+                return True
+    return False
+
+
+def measure(label, func, pairs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = [func(high, low) for high, low in pairs]
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:>22} {elapsed * 1e3:>9.1f}ms {peak / 2**20:>9.2f}MiB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=3)
+    parser.add_argument('--bars', type=int, default=5000)
+    args = parser.parse_args()
+
+    frames = [(synthetic_frame(args.bars, seed=2 * s), synthetic_frame(args.bars, seed=2 * s + 1))
+              for s in range(args.symbols)]
+    bars = [(dd.BarArrays.from_frame(high), dd.BarArrays.from_frame(low)) for high, low in frames]
+
+    print(f"{'input':>22} {'time':>11} {'peak':>12}")
+    expected = measure('DataFrame (original)', reference_conditions, frames)
+    assert measure('DataFrame', dd.check_divergence_conditions, frames) == expected
+    assert measure('BarArrays', dd.check_divergence_conditions, bars) == expected
+
+
+if __name__ == '__main__':
+    main()
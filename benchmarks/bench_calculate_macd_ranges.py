@@ -0,0 +1,44 @@
+"""
+Speedup of the vectorized calculate_macd_ranges (full history and early_exit) over the
+original per-bar loop.
+
+    python benchmarks/bench_calculate_macd_ranges.py [--sizes 1000 10000 1000000] [--reference-max 10000]
+
+The reference loop is only timed up to --reference-max bars (it needs minutes at 1M);
+above that only the vectorized timing is reported.
+"""
+import argparse
+
+import pandas as pd
+
+from common import best_of, synthetic_frame
+import reference
+import divergence_detector as dd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 1_000_000])
+    parser.add_argument('--reference-max', type=int, default=10_000)
+    parser.add_argument('--limit-zones', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'bars':>10} {'reference':>12} {'vectorized':>12} {'early_exit':>12} {'speedup':>9}")
+    for n in args.sizes:
+        df = synthetic_frame(n)
+        new = dd.calculate_macd_ranges(df, 'def', args.limit_zones)
+        pd.testing.assert_frame_equal(dd.calculate_macd_ranges(df, 'def', args.limit_zones, early_exit=True), new)
+        t_new = best_of(lambda: dd.calculate_macd_ranges(df, 'def', args.limit_zones))
+        t_tail = best_of(lambda: dd.calculate_macd_ranges(df, 'def', args.limit_zones, early_exit=True))
+        if n <= args.reference_max:
+            old = reference.calculate_macd_ranges(df, 'def', args.limit_zones)
+            pd.testing.assert_frame_equal(new, old)
+            t_old = best_of(lambda: reference.calculate_macd_ranges(df, 'def', args.limit_zones), repeat=1)
+            print(f"{n:>10} {t_old * 1e3:>10.2f}ms {t_new * 1e3:>10.2f}ms {t_tail * 1e3:>10.2f}ms "
+                  f"{t_old / t_new:>8.1f}x")
+        else:
+            print(f"{n:>10} {'-':>12} {t_new * 1e3:>10.2f}ms {t_tail * 1e3:>10.2f}ms {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+calculate_macd_ranges_chunked vs the single-pass calculate_macd_ranges on one long series:
+wall time and peak traced allocations (the input arrays themselves are not counted).
+The zone tables are compared before timing.
+
+    python benchmarks/bench_chunked.py [--bars 5000000] [--chunks 65536 1048576] [--workers 4]
+"""
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from common import best_of, synthetic_frame
+import chunked
+import divergence_detector as dd
+
+
+def peak_mib(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=5_000_000)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[65_536, 1_048_576])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    bars = dd.BarArrays.from_frame(synthetic_frame(args.bars, seed=1, regime='choppy'), ['macd_12_26_9'])
+
+    single = lambda: dd.calculate_macd_ranges(bars, 'def', 7)
+    expected = single()
+    print(f"{'mode':<28} {'ms':>9} {'peak MiB':>9}")
+    print(f"{'single pass':<28} {best_of(single, repeat=3) * 1e3:>9.1f} {peak_mib(single):>9.1f}")
+    for chunk in args.chunks:
+        run = lambda: chunked.calculate_macd_ranges_chunked(bars, 'def', 7, chunk=chunk, workers=args.workers)
+        got = run()
+        for name in ('range_extreme', 'macd_extreme', 'range_number', 'time_extreme', 'start'):
+            np.testing.assert_array_equal(getattr(got, name), getattr(expected, name))
+        print(f"{f'chunked ({chunk} bars)':<28} {best_of(run, repeat=3) * 1e3:>9.1f} {peak_mib(run):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+compare_zones at growing zone-table depths (limit_zones), next to the fixed-lookback
+evaluate_divergence. Before timing, compare_zones with LEGACY_RULES is checked against
+evaluate_divergence on every regime / preset.
+
+    python benchmarks/bench_compare_zones.py [--bars 20000] [--depths 7 20 50 100]
+"""
+import argparse
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+
+
+def check_legacy(bars):
+    for regime in ('random', 'choppy', 'trending'):
+        df = synthetic_frame(bars, seed=4, regime=regime)
+        for preset in ('low2', 'low1', 'def', 'high'):
+            zones = dd.calculate_macd_ranges(df, preset, 7)
+            for check_for in ("Bearish_Divergence", "Bullish_Divergence"):
+                legacy = dd.compare_zones(zones, check_for, dd.LEGACY_RULES, min_zones=6).combined()
+                assert legacy == dd.evaluate_divergence(zones, check_for).flags, (regime, preset, check_for)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=20_000)
+    parser.add_argument('--depths', type=int, nargs='+', default=[7, 20, 50, 100])
+    args = parser.parse_args()
+    check_legacy(args.bars)
+    print('LEGACY_RULES: matches evaluate_divergence')
+
+    df = synthetic_frame(args.bars, seed=1, regime='choppy')
+    print(f"{'limit_zones':>11} {'pairs':>6} {'compare_zones':>14} {'evaluate_divergence':>20}")
+    for depth in args.depths:
+        zones = dd.calculate_macd_ranges(df, 'def', depth)
+        pairs = len(dd.compare_zones(zones, "Bearish_Divergence"))
+        t_pairs = best_of(lambda: dd.compare_zones(zones, "Bearish_Divergence"), repeat=5, number=200)
+        t_legacy = best_of(lambda: dd.evaluate_divergence(zones, "Bearish_Divergence"), repeat=5, number=200)
+        print(f"{depth:>11} {pairs:>6} {t_pairs * 1e6:>12.1f}us {t_legacy * 1e6:>18.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+detect_divergence_batch against a Python loop of evaluate_divergence over the same zone
+tables. Flags are checked row by row first, including NaN-padded short windows. The loop
+time is measured on at most 2000 windows and scaled up.
+
+    python benchmarks/bench_detect_divergence_batch.py [--windows 1000 100000] [--zones 7]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common import best_of
+import divergence_detector as dd
+
+
+def random_zone_tables(windows, zones, seed=0):
+    """
+    Alternating-sign zone tables with small integer values so that ties and every rule fire.
+    """
+    rng = np.random.default_rng(seed)
+    start_positive = rng.random(windows) < 0.5
+    signs = np.where((np.arange(zones)[None, :] % 2 == 0) == start_positive[:, None], 1.0, -1.0)
+    macd = signs * rng.integers(0, 4, (windows, zones))
+    price = rng.integers(0, 4, (windows, zones)).astype(np.float64)
+    counts = rng.integers(0, zones + 1, windows)
+    short = np.arange(zones)[None, :] < (zones - counts)[:, None]
+    macd[short] = np.nan
+    price[short] = np.nan
+    return price, macd, counts
+
+
+def loop_flags(price, macd, counts, check_for):
+    flags = np.zeros(len(price), dtype=np.int64)
+    for row in range(len(price)):
+        k = counts[row]
+        table = pd.DataFrame({'range_extreme': price[row, len(price[row]) - k:],
+                              'macd_extreme': macd[row, len(macd[row]) - k:]})
+        flags[row] = dd.evaluate_divergence(table, check_for).flags
+    return flags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--windows', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--zones', type=int, default=7)
+    args = parser.parse_args()
+
+    price, macd, counts = random_zone_tables(5_000, args.zones, seed=1)
+    for check_for in ("Bearish_Divergence", "Bullish_Divergence"):
+        expected = loop_flags(price, macd, counts, check_for)
+        np.testing.assert_array_equal(dd.detect_divergence_batch(price, macd, check_for, counts), expected)
+
+    print(f"{'windows':>10} {'loop':>10} {'batch':>10} {'speedup':>9}")
+    for windows in args.windows:
+        price, macd, counts = random_zone_tables(windows, args.zones)
+        t_batch = best_of(lambda: dd.detect_divergence_batch(price, macd, zone_counts=counts))
+        sample = min(windows, 2_000)
+        t_loop = best_of(lambda: loop_flags(price[:sample], macd[:sample], counts[:sample], "Bearish_Divergence"),
+                         repeat=1) * windows / sample
+        print(f"{windows:>10} {t_loop * 1e3:>8.1f}ms {t_batch * 1e3:>8.2f}ms {t_loop / t_batch:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
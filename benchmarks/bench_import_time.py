@@ -0,0 +1,103 @@
+"""
+Import-time budget for the worker entry points (python -X importtime in a fresh interpreter).
+
+Each module is imported after numpy, so its cumulative time is what it adds on top of NumPy.
+Budgets are fractions of numpy's own import time in the same child, so the gate does not
+depend on how fast the host is. The same child then runs the BarArrays detection path and
+reports whether pandas got loaded: array callers (cron workers, scanner pool children) must
+start on NumPy alone.
+
+    python benchmarks/bench_import_time.py [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('divergence_detector', 'scanner', 'streaming', 'multi_timeframe', 'bar_store')
+# Import time on top of numpy, as a fraction of numpy's import time with warm .pyc files
+# (divergence_detector includes indicators)
+BUDGETS = {'divergence_detector': 0.15, 'scanner': 0.10, 'streaming': 0.10, 'multi_timeframe': 0.10,
+           'bar_store': 0.10}
+
+CHILD = """
+import numpy as np
+import {modules}
+import divergence_detector as dd
+
+rng = np.random.default_rng(0)
+n = 2000
+close = 1.25 + np.cumsum(rng.normal(0, 0.0005, n))
+macd = np.convolve(np.diff(close, prepend=close[0]), np.ones(12), 'same')
+bars = dd.BarArrays(np.arange(n, dtype=np.int64) * 300_000_000_000, close, close + 0.0003,
+                    close - 0.0003, close, {{'macd_12_26_9': macd, 'macd_6_13_5': macd}})
+dd.check_divergence_conditions(bars, bars, "Bearish")
+dd.detect_divergence(dd.calculate_macd_ranges(bars, 'def', 7), "Bearish_Divergence")
+dd.find_local_extremes(bars, 'macd_12_26_9', 'high')
+import sys
+print('pandas loaded:', 'pandas' in sys.modules)
+"""
+
+
+def measure(pycache):
+    """
+    One fresh interpreter: ({module: cumulative ms}, numpy ms, pandas loaded).
+    pycache: directory for the .pyc files, so they are written even under PYTHONDONTWRITEBYTECODE.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+               PYTHONPYCACHEPREFIX=pycache)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD.format(modules=', '.join(MODULES))],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    times = {}
+    for line in child.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() in MODULES + ('numpy',) and cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e3
+    return times, times.pop('numpy'), 'pandas loaded: True' in child.stdout
+
+
+def check(repeat=5):
+    """
+    Best-of-repeat import times relative to numpy; returns ({module: (ms, fraction)}, numpy ms,
+    list of budget / pandas problems).
+    """
+    best, baseline, pandas_loaded = {}, float('inf'), False
+    with tempfile.TemporaryDirectory() as pycache:
+        measure(pycache)   # compiles the .pyc files
+        runs = [measure(pycache) for _ in range(repeat)]
+    for times, numpy_ms, loaded in runs:
+        pandas_loaded |= loaded
+        baseline = min(baseline, numpy_ms)
+        for module, ms in times.items():
+            if module not in best or ms / numpy_ms < best[module][1]:
+                best[module] = (ms, ms / numpy_ms)
+    problems = [f'{module} imports in {ms:.1f}ms = {fraction:.0%} of numpy, budget {BUDGETS[module]:.0%}'
+                for module, (ms, fraction) in best.items() if fraction > BUDGETS[module]]
+    if pandas_loaded:
+        problems.append('pandas was imported by the BarArrays detection path')
+    return best, baseline, problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    times, baseline, problems = check(args.repeat)
+    print(f"{'numpy':<22} {baseline:>7.1f}ms  (baseline)")
+    for module, (ms, fraction) in times.items():
+        print(f'{module:<22} {ms:>7.1f}ms  {fraction:>5.1%} of numpy (budget {BUDGETS[module]:.0%})')
+    for problem in problems:
+        print(problem)
+    print('import time: ok' if not problems else f'import time: {len(problems)} problems')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Fused MACD/EMA computation (indicators.macd_block / ema_block) against the per-preset
+pandas ewm calls of examples/app.py. Values are checked against pandas ewm first.
+
+    python benchmarks/bench_indicators.py [--sizes 2000 5000 100000 1000000]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common import MACD_PARAMS, best_of
+import indicators
+
+MA_PERIODS = [15, 30, 60, 240]
+
+
+def pandas_indicators(df):
+    for period in MA_PERIODS:
+        df[f'MA_{period}'] = df['close'].ewm(span=period, adjust=True).mean()
+    for fast, slow, signal in MACD_PARAMS:
+        macd_line = df['close'].ewm(span=fast, adjust=False).mean() - df['close'].ewm(span=slow, adjust=False).mean()
+        df[f'macd_{fast}_{slow}_{signal}'] = macd_line
+        df[f'macdS_{fast}_{slow}_{signal}'] = macd_line.ewm(span=signal, adjust=False).mean()
+    return df
+
+
+def fused_indicators(df):
+    return indicators.add_macds(indicators.add_emas(df, MA_PERIODS, adjust=True), MACD_PARAMS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2_000, 5_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'bars':>10} {'pandas':>10} {'fused':>10} {'speedup':>9}")
+    for n in args.sizes:
+        rng = np.random.default_rng(n)
+        frame = pd.DataFrame({'close': 1.25 + np.cumsum(rng.normal(0, 0.0005, n))})
+        expected = pandas_indicators(frame.copy())
+        assert list(fused_indicators(frame).columns) == list(expected.columns)
+        actual = fused_indicators(frame.copy())
+        for column in expected.columns:
+            np.testing.assert_allclose(actual[column], expected[column], rtol=1e-9, atol=1e-12, err_msg=column)
+        t_pandas = best_of(lambda: pandas_indicators(frame.copy()))
+        t_fused = best_of(lambda: fused_indicators(frame.copy()))
+        print(f"{n:>10} {t_pandas * 1e3:>8.2f}ms {t_fused * 1e3:>8.2f}ms {t_pandas / t_fused:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Overhead of the Instrumentation hook: check_divergence_conditions with no Instrumentation
+active, with one active, and with allocation tracking; then the per-stage breakdown.
+
+    python benchmarks/bench_instrumentation.py [--bars 5000]
+"""
+import argparse
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=5_000)
+    args = parser.parse_args()
+    df, lower_df = synthetic_frame(args.bars, seed=1), synthetic_frame(args.bars, seed=2)
+    call = lambda: dd.check_divergence_conditions(df, lower_df, "Bearish")
+
+    t_off = best_of(call, repeat=5, number=200)
+    with dd.Instrumentation() as stats:
+        t_on = best_of(call, repeat=5, number=200)
+    with dd.Instrumentation(track_allocations=True):
+        t_alloc = best_of(call, repeat=3, number=20)
+    print(f"disabled {t_off * 1e6:.1f}us, enabled {t_on * 1e6:.1f}us, "
+          f"with allocations {t_alloc * 1e6:.1f}us per call")
+
+    print(f"\n{'stage':<30} {'calls':>7} {'ms/call':>9} {'bars/call':>10}")
+    for stage, entry in stats.as_dict().items():
+        print(f"{stage:<30} {entry['calls']:>7} {entry['seconds'] / entry['calls'] * 1e3:>9.3f} "
+              f"{entry['bars'] / entry['calls']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+find_local_extremes: the original per-bar iloc loop versus the shifted-array version, on a
+DataFrame and on BarArrays. Outputs must match. Also times calculate_macd_ranges_with_extremes
+against the original loop (whose output differs: it splits long zones in the zone table).
+
+    python benchmarks/bench_local_extremes.py [--bars 50 5000]
+"""
+import argparse
+
+import pandas as pd
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+import reference
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, nargs='+', default=[50, 5_000])
+    args = parser.parse_args()
+
+    print(f"{'bars':>7} {'original':>11} {'DataFrame':>11} {'BarArrays':>11} {'speedup':>9}")
+    for n in args.bars:
+        df = synthetic_frame(n, seed=n)
+        bars = dd.BarArrays.from_frame(df)
+        call = ('macd_12_26_9', 'high')
+        expected = reference.find_local_extremes(df, *call)
+        pd.testing.assert_frame_equal(dd.find_local_extremes(df, *call), expected)
+        # BarArrays times are always ns; the original keeps the frame's unit
+        pd.testing.assert_frame_equal(dd.find_local_extremes(bars, *call).to_frame(), expected, check_dtype=False)
+
+        number = max(1, 20_000 // n)
+        t_ref = best_of(lambda: reference.find_local_extremes(df, *call), repeat=3, number=max(1, number // 20))
+        t_df = best_of(lambda: dd.find_local_extremes(df, *call), number=number)
+        t_bars = best_of(lambda: dd.find_local_extremes(bars, *call), number=number)
+        print(f"{n:>7} {t_ref * 1e3:>9.3f}ms {t_df * 1e3:>9.3f}ms {t_bars * 1e3:>9.3f}ms {t_ref / t_bars:>8.0f}x")
+
+    print("\ncalculate_macd_ranges_with_extremes")
+    for n in args.bars:
+        df = synthetic_frame(n, seed=n)
+        bars = dd.BarArrays.from_frame(df)
+        zones, extremes = dd.calculate_macd_ranges_with_extremes(df, 'def', 7, 40)
+        # The merged table: every extreme once, plus one row per zone without extremes
+        table = dd.merge_zone_extremes(zones, extremes)
+        bare = ~zones['range_number'].isin(extremes['range_number'])
+        assert len(table) == len(extremes) + bare.sum()
+        pd.testing.assert_frame_equal(table[zones.columns].drop_duplicates(), zones)
+        merged = dd.merge_zone_extremes(*dd.calculate_macd_ranges_with_extremes(bars, 'def', 7, 40))
+        merged['local_time'] = merged['local_time'].astype(table['local_time'].dtype)   # ns vs the frame's unit
+        pd.testing.assert_frame_equal(merged, table, check_dtype=False, check_index_type=False)
+
+        number = max(1, 20_000 // n)
+        try:
+            t_ref = best_of(lambda: reference.calculate_macd_ranges_with_extremes(df, 'def', 7, 40), number=1)
+        except KeyError:   # the original fails when no chunk has an extreme
+            t_ref = float('nan')
+        t_df = best_of(lambda: dd.calculate_macd_ranges_with_extremes(df, 'def', 7, 40), number=number)
+        t_bars = best_of(lambda: dd.calculate_macd_ranges_with_extremes(bars, 'def', 7, 40), number=number)
+        print(f"{n:>7} {t_ref * 1e3:>9.3f}ms {t_df * 1e3:>9.3f}ms {t_bars * 1e3:>9.3f}ms {t_ref / t_bars:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
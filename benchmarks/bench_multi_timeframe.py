@@ -0,0 +1,51 @@
+"""
+"Divergence as of T on any of M30/M15/M5" for many T: boolean-mask filtering plus two
+check_divergence_conditions calls (the examples/app.py way) versus MultiTimeframeContext.confirm.
+Answers must agree.
+
+    python benchmarks/bench_multi_timeframe.py [--queries 200]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import synthetic_frame
+import divergence_detector as dd
+from multi_timeframe import MultiTimeframeContext
+
+
+def masked(frames, t, divergence_type):
+    m30, m15, m5 = (df[df['time'] <= t] for df in frames.values())
+    return (dd.check_divergence_conditions(m30, m15, divergence_type) or
+            dd.check_divergence_conditions(m15, m5, divergence_type))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    frames = {'M30': synthetic_frame(2000, seed=1, freq='30min'),
+              'M15': synthetic_frame(3500, seed=2, freq='15min'),
+              'M5': synthetic_frame(5000, seed=3, freq='5min')}
+    first, last = frames['M5']['time'].iloc[0], frames['M30']['time'].iloc[-1]
+    ts = pd.to_datetime(np.random.default_rng(0).integers(first.value, last.value, args.queries))
+
+    start = time.perf_counter()
+    expected = [masked(frames, t, "Bearish") for t in ts]
+    t_masked = (time.perf_counter() - start) / args.queries
+
+    start = time.perf_counter()
+    context = MultiTimeframeContext(frames)
+    got = [context.confirm("Bearish", t) for t in ts]
+    t_context = (time.perf_counter() - start) / args.queries
+
+    assert got == expected
+    print(f"per query: masks + check_divergence_conditions {t_masked * 1e3:.3f}ms, "
+          f"MultiTimeframeContext.confirm {t_context * 1e3:.3f}ms ({t_masked / t_context:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
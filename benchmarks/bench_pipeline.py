@@ -0,0 +1,62 @@
+"""
+End-to-end latency of the examples/app.py flow (fetch M30, M15, M5, add MACDs, two
+check_divergence_conditions calls) done one step after another versus run_pipeline, on a
+ReplayFeed that sleeps to mimic terminal round trips. Signals must agree.
+
+    python benchmarks/bench_pipeline.py [--symbols 4] [--latency 0.05 0.03 0.08]
+"""
+import argparse
+import asyncio
+import time
+
+from common import synthetic_frame
+import divergence_detector as dd
+import indicators
+from pipeline import ReplayFeed, run_pipeline
+
+TIMEFRAMES = ('M30', 'M15', 'M5')
+COUNTS = {'M30': 2000, 'M15': 3500, 'M5': 5000}
+PAIRS = (('M30', 'M15'), ('M15', 'M5'))
+
+
+async def sequential(feed, symbols):
+    signals = {}
+    for symbol in symbols:
+        frames = {}
+        for timeframe in TIMEFRAMES:
+            frames[timeframe] = indicators.add_macds(await feed.fetch(symbol, timeframe, COUNTS[timeframe]))
+        for higher, lower in PAIRS:
+            signals[symbol, higher, lower] = dd.check_divergence_conditions(frames[higher], frames[lower], "Bearish")
+    return signals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--latency', type=float, nargs=3, default=[0.05, 0.03, 0.08])
+    args = parser.parse_args()
+
+    symbols = [f'SYM{k}' for k in range(args.symbols)]
+    frames = {
+        symbol: {timeframe: synthetic_frame(COUNTS[timeframe], seed=10 * s + t)[['time', 'open', 'high', 'low', 'close']]
+                 for t, timeframe in enumerate(TIMEFRAMES)}
+        for s, symbol in enumerate(symbols)
+    }
+    feed = ReplayFeed(frames, latency=dict(zip(TIMEFRAMES, args.latency)))
+
+    start = time.perf_counter()
+    expected = asyncio.run(sequential(feed, symbols))
+    t_sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = asyncio.run(run_pipeline(feed, symbols, PAIRS, COUNTS))
+    t_pipeline = time.perf_counter() - start
+
+    got = {(row.symbol, row.timeframe, row.lower_timeframe): row.signal for row in results.itertuples()}
+    assert got == expected
+    print(f"{len(symbols)} symbols x {len(TIMEFRAMES)} timeframes: sequential {t_sequential * 1e3:.0f}ms, "
+          f"pipeline {t_pipeline * 1e3:.0f}ms (slowest single fetch {max(args.latency) * 1e3:.0f}ms)")
+
+
+if __name__ == '__main__':
+    main()
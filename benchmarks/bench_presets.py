@@ -0,0 +1,45 @@
+"""
+Preset sweep: check_divergence over a grid of (fast, slow, signal) triples on one frame.
+
+baseline: per combo, attach the MACD columns with indicators.add_macds and call
+check_divergence on the frame. batch: evaluate_presets with a PresetSet resolved once.
+The flags of both are compared before timing.
+
+    python benchmarks/bench_presets.py [--bars 5000] [--combos 50]
+"""
+import argparse
+import itertools
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+import indicators
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=5_000)
+    parser.add_argument('--combos', type=int, default=50)
+    args = parser.parse_args()
+    df = synthetic_frame(args.bars, seed=1)
+    grid = itertools.product(range(3, 16), range(17, 60, 3), (5, 9))
+    triples = [(fast, slow, signal) for fast, slow, signal in grid][:args.combos]
+    presets = indicators.PresetSet(triples)
+
+    def baseline():
+        flags = []
+        for triple in triples:
+            frame = indicators.add_macds(df, [triple])
+            flags.append(int(dd.evaluate_divergence(dd.calculate_macd_ranges(frame, triple, 7, early_exit=True)).flags))
+        return flags
+
+    batch = lambda: dd.evaluate_presets(df, presets)
+    assert batch().tolist() == baseline(), 'evaluate_presets differs from the per-combo loop'
+
+    t_base = best_of(baseline, repeat=3, number=1)
+    t_batch = best_of(batch, repeat=5, number=3)
+    print(f"{len(triples)} combos x {args.bars} bars: per-combo {t_base * 1e3:.1f}ms, "
+          f"evaluate_presets {t_batch * 1e3:.1f}ms ({t_base / t_batch:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput of scanner.scan_universe against the worker count. Verdicts are checked against
+check_divergence before timing.
+
+    python benchmarks/bench_scan_universe.py [--symbols 200] [--bars 3000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import time
+
+from common import synthetic_frame
+import divergence_detector as dd
+from scanner import scan_universe
+
+TIMEFRAMES = ['M30', 'M15', 'M5']
+PRESETS = ('def', 'low1')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=3000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    frames = {
+        f'SYM{s:03d}': {tf: synthetic_frame(args.bars, seed=s * 10 + k) for k, tf in enumerate(TIMEFRAMES)}
+        for s in range(args.symbols)
+    }
+    checks = args.symbols * len(TIMEFRAMES) * len(PRESETS)
+
+    results = scan_universe(frames, PRESETS, workers=1)
+    for row in results.head(60).itertuples():
+        expected = dd.check_divergence(frames[row.symbol][row.timeframe], "Bearish_Divergence", row.preset)
+        assert row.verdict == expected, (row, expected)
+    # limit_zones below 1 keeps no zones; fractional values keep the whole zones below them
+    for limit_zones in (0, 0.5, 6.5, 7.9):
+        for row in scan_universe(frames, PRESETS, workers=1, limit_zones=limit_zones).head(60).itertuples():
+            expected = dd.check_divergence(frames[row.symbol][row.timeframe], "Bearish_Divergence", row.preset,
+                                           limit_zones)
+            assert row.verdict == expected, (limit_zones, row, expected)
+
+    print(f"{checks} checks ({args.symbols} symbols x {len(TIMEFRAMES)} timeframes x {len(PRESETS)} presets), "
+          f"{os.cpu_count()} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'checks/s':>10} {'scaling':>8}")
+    base = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        scan_universe(frames, PRESETS, workers=workers)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"{workers:>8} {elapsed:>9.3f} {checks / elapsed:>10.0f} {base / elapsed:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
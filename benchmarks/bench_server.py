@@ -0,0 +1,120 @@
+"""
+SignalServer on a replayed feed: verdicts are checked against check_divergence, then the
+query latency (client round trip over one keep-alive connection, and server side) and the
+recompute cost per bar close are reported, with a WebSocket subscriber counting pushes.
+
+    python benchmarks/bench_server.py [--bars 5000] [--symbols 4] [--requests 5000] [--closes 50]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+
+import numpy as np
+
+from common import synthetic_frame
+import divergence_detector as dd
+from indicators import add_macds
+from pipeline import ReplayFeed
+from server import SignalServer
+
+TIMEFRAMES = ('M30', 'M15', 'M5')
+FREQUENCIES = {'M30': '30min', 'M15': '15min', 'M5': '5min'}
+
+
+async def get(reader, writer, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+    return head.split(b' ')[1], await reader.readexactly(length)
+
+
+async def subscribe(port, received):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write((f'GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                  f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n').encode())
+    await reader.readuntil(b'\r\n\r\n')
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = int.from_bytes(await reader.readexactly(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(await reader.readexactly(8), 'big')
+        payload = await reader.readexactly(length)
+        if first & 0x0F == 0x8:
+            return
+        received.append(json.loads(payload))
+
+
+async def run(args):
+    symbols = [f'SYM{k}' for k in range(args.symbols)]
+    frames = {symbol: {timeframe: synthetic_frame(args.bars, seed=k * 10 + j, freq=FREQUENCIES[timeframe])
+                       for j, timeframe in enumerate(TIMEFRAMES)} for k, symbol in enumerate(symbols)}
+    times = frames[symbols[0]]['M5']['time']
+    feed = ReplayFeed(frames, end_time=times.iloc[-args.closes - 1])
+    server = await SignalServer(port=0).start()
+    received = []
+    subscriber = asyncio.ensure_future(subscribe(server.port, received))
+    try:
+        await server.follow(feed, symbols, TIMEFRAMES, iterations=1)
+
+        # Parity with check_divergence on the bars the feed served
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        for symbol in symbols:
+            for timeframe in TIMEFRAMES:
+                df = add_macds(await feed.fetch(symbol, timeframe, 5000), ('def', 'low1'))
+                for preset in ('def', 'low1'):
+                    for check in server.checks:
+                        status, body = await get(reader, writer, f'/signal/{symbol}/{timeframe}/{preset}/{check}')
+                        assert status == b'200', status
+                        expected = dd.check_divergence(df, check, preset, 7)
+                        assert json.loads(body)['verdict'] == expected, (symbol, timeframe, preset, check)
+        print('signals match check_divergence')
+
+        paths = [f'/signal/{symbol}/M30/def/Bearish_Divergence' for symbol in symbols]
+        latencies = np.empty(args.requests)
+        for i in range(args.requests):
+            started = time.perf_counter()
+            await get(reader, writer, paths[i % len(paths)])
+            latencies[i] = time.perf_counter() - started
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+        print(f'{args.requests} queries, client round trip p50 {p50:.0f}us p99 {p99:.0f}us')
+
+        # Replay bar closes on M5; the other timeframes only recompute when their bar changes
+        step = times.iloc[-1] - times.iloc[-2]
+        for _ in range(args.closes):
+            feed.end_time = feed.end_time + step
+            await server.follow(feed, symbols, TIMEFRAMES, iterations=1)
+        await asyncio.sleep(0.05)
+
+        stages = server.metrics.as_dict()
+        recompute, request = stages['recompute'], stages['request']
+        print(f"recompute: {recompute['calls']} snapshots, {recompute['seconds'] / recompute['calls'] * 1e3:.2f}ms each; "
+              f"server-side request {request['seconds'] / request['calls'] * 1e6:.1f}us mean")
+        print(f'websocket pushes received: {len(received)}')
+        _, metrics = await get(reader, writer, '/metrics')
+        print('\n'.join(line for line in metrics.decode().splitlines() if 'quantile' in line))
+        writer.close()
+    finally:
+        await server.close()
+        try:
+            await asyncio.wait_for(subscriber, 5)
+        except asyncio.TimeoutError:
+            print('websocket subscriber was not closed by the server')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=5_000)
+    parser.add_argument('--symbols', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=5_000)
+    parser.add_argument('--closes', type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Per-update cost of StreamingDivergenceDetector against re-running check_divergence on the
+whole frame, at growing history lengths. Verdicts are checked against check_divergence
+(including a revised live bar) before timing.
+
+    python benchmarks/bench_streaming.py [--sizes 1000 10000 100000]
+"""
+import argparse
+
+import numpy as np
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+from streaming import StreamingDivergenceDetector
+
+
+def check_parity(df, check_for, preset='def'):
+    detector = StreamingDivergenceDetector(preset, 7, check_for)
+    macd_col = dd._macd_column(preset)
+    rng = np.random.default_rng(1)
+    for t in range(len(df)):
+        row = df.iloc[t]
+        revised = row.copy()
+        revised[macd_col] = row[macd_col] + rng.normal(0, 0.002)
+        revised['high'] = row['high'] + 0.001
+        detector.update(revised)
+        verdict = detector.update(row)
+        expected = dd.check_divergence(df.iloc[:t + 1], check_for, preset, 7)
+        assert verdict == expected, (t, verdict, expected)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    sample = synthetic_frame(400, seed=3)
+    for check_for in ("Bearish_Divergence", "Bullish_Divergence"):
+        check_parity(sample, check_for)
+
+    print(f"{'bars':>10} {'check_divergence':>18} {'update':>10}")
+    for n in args.sizes:
+        df = synthetic_frame(n)
+        detector = StreamingDivergenceDetector('def')
+        detector.warm_up(df)
+        bar = df.iloc[-1].to_dict()
+        t_full = best_of(lambda: dd.check_divergence(df), number=20)
+        t_update = best_of(lambda: detector.update(bar), number=2000)
+        print(f"{n:>10} {t_full * 1e6:>16.1f}us {t_update * 1e6:>8.1f}us")
+
+
+if __name__ == '__main__':
+    main()
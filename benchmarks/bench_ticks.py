@@ -0,0 +1,114 @@
+"""
+TickAggregator on recorded ticks: ticks per second and tick-to-signal latency of the
+replay driver, after parity checks on the same ticks:
+- candles match a pandas groupby of the ticks, MACD matches indicators.macd_block,
+- every 'close' event equals check_divergence on the candles up to that close,
+- warm_up with candle history then ticks gives the same candles and MACD.
+
+    python benchmarks/bench_ticks.py [--ticks 200000] [--symbols 2]
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Imported only for its side effect: common puts the repository root on sys.path for the
+# divergence_detector / indicators / ticks imports below
+import common  # noqa: F401
+import divergence_detector as dd
+from indicators import macd_block
+from ticks import TIMEFRAME_SECONDS, TickAggregator, replay_ticks
+
+TIMEFRAMES = ('M5', 'M15', 'M30')
+PRESETS = ('def', 'low1')
+
+
+def synthetic_ticks(n, symbols, seed=0):
+    """
+    Ticks every ~1.5 s (exponential gaps) on a random-walk bid, round-robin over symbols.
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2025-07-14T00:00', 'ms').astype(np.int64)
+    time_msc = start + np.cumsum(rng.exponential(1500, n)).astype(np.int64)
+    bid = 1.25 + np.cumsum(rng.normal(0, 0.00005, n))
+    symbol = np.array([f'SYM{k}' for k in range(symbols)])[np.arange(n) % symbols]
+    return pd.DataFrame({'time_msc': time_msc, 'bid': bid, 'symbol': symbol})
+
+
+def candles(ticks, timeframe):
+    period = TIMEFRAME_SECONDS[timeframe] * 1_000_000_000
+    time = ticks['time_msc'].to_numpy(dtype=np.int64) * 1_000_000
+    grouped = ticks.assign(bucket=time - time % period).groupby('bucket')['bid']
+    return pd.DataFrame({'time': grouped.first().index.to_numpy().view('datetime64[ns]'),
+                         'open': grouped.first().to_numpy(), 'high': grouped.max().to_numpy(),
+                         'low': grouped.min().to_numpy(), 'close': grouped.last().to_numpy()})
+
+
+def check_candles(aggregator, symbol, timeframe, expected):
+    bars = aggregator.bars(symbol, timeframe)
+    np.testing.assert_array_equal(bars.time, expected['time'].to_numpy().view(np.int64))
+    for name in ('open', 'high', 'low', 'close'):
+        np.testing.assert_array_equal(getattr(bars, name), expected[name].to_numpy())
+    block, columns = macd_block(bars.close, PRESETS)
+    for k, column in enumerate(columns):
+        np.testing.assert_allclose(bars.macd[column], block[:, k], rtol=1e-9, atol=1e-12)
+
+
+def check_parity(ticks):
+    symbol = ticks['symbol'].iloc[0]
+    ticks = ticks[ticks['symbol'] == symbol]
+    for check_for in ("Bearish_Divergence", "Bullish_Divergence"):
+        closes = []
+        aggregator = TickAggregator(TIMEFRAMES, PRESETS, check_for, capacity=1 << 20,
+                                    callbacks=[lambda event: event.kind == 'close' and closes.append(event)])
+        for time, bid in zip(ticks['time_msc'].to_numpy() * 1_000_000, ticks['bid'].to_numpy()):
+            aggregator.on_tick(symbol, int(time), bid)
+        for timeframe in TIMEFRAMES:
+            check_candles(aggregator, symbol, timeframe, candles(ticks, timeframe))
+        for event in closes:
+            bars = aggregator.bars(symbol, event.timeframe)
+            end = int(np.searchsorted(bars.time, event.time, side='right'))
+            expected = dd.check_divergence(bars[:end], check_for, event.preset, 7)
+            assert str(event.result) == expected, (event, expected)
+        for timeframe in TIMEFRAMES:
+            for k, preset in enumerate(PRESETS):
+                result = aggregator._series[symbol, timeframe].results[k]
+                assert str(result) == dd.check_divergence(aggregator.bars(symbol, timeframe), check_for, preset, 7)
+        print(f'{check_for}: {len(closes)} close events match check_divergence')
+
+    # Warm up from candles of the first half, then continue with the ticks
+    half = len(ticks) // 2
+    aggregator = TickAggregator(TIMEFRAMES, PRESETS, capacity=1 << 20)
+    for timeframe in TIMEFRAMES:
+        aggregator.warm_up(symbol, timeframe, candles(ticks.iloc[:half], timeframe))
+    for time, bid in zip(ticks['time_msc'].to_numpy()[half:] * 1_000_000, ticks['bid'].to_numpy()[half:]):
+        aggregator.on_tick(symbol, int(time), bid)
+    for timeframe in TIMEFRAMES:
+        check_candles(aggregator, symbol, timeframe, candles(ticks, timeframe))
+    print('warm_up + ticks: candles and MACD match')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ticks', type=int, default=200_000)
+    parser.add_argument('--symbols', type=int, default=2)
+    args = parser.parse_args()
+    ticks = synthetic_ticks(args.ticks, args.symbols)
+    check_parity(ticks.iloc[:min(len(ticks), 40_000)])
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'ticks.csv')
+        ticks.to_csv(path, index=False)
+        for changes_only in (True, False):
+            stats = replay_ticks(path, TickAggregator(TIMEFRAMES, PRESETS, changes_only=changes_only))
+            latency, signal = stats['latency_us'], stats['signal_latency_us']
+            print(f"changes_only={changes_only}: {stats['ticks']} ticks, {stats['events']} events, "
+                  f"{stats['ticks_per_second']:,.0f} ticks/s; latency p50 {latency['p50']:.1f}us "
+                  f"p99 {latency['p99']:.1f}us; tick-to-signal p50 {signal['p50']:.1f}us "
+                  f"p99 {signal['p99']:.1f}us max {signal['max']:.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+walk_forward_signals against the naive loop that calls check_divergence on df.iloc[:t + 1]
+for every bar. Signals are checked bar by bar on a small sample first.
+
+    python benchmarks/bench_walk_forward.py [--sizes 2000 100000 1000000]
+"""
+import argparse
+
+import numpy as np
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+from backtest import walk_forward_signals
+
+
+def naive_signals(df, preset, check_for):
+    return np.array([
+        dd.evaluate_divergence(dd.calculate_macd_ranges(df.iloc[:t + 1], preset, 7), check_for).flags
+        for t in range(len(df))
+    ], dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for seed in range(3):
+        sample = synthetic_frame(600, seed=seed)
+        for check_for in ("Bearish_Divergence", "Bullish_Divergence"):
+            signals = walk_forward_signals(sample, ('def', 'low2'), check_for)
+            for preset in ('def', 'low2'):
+                np.testing.assert_array_equal(signals[f'signal_{preset}'].to_numpy(),
+                                              naive_signals(sample, preset, check_for))
+
+    print(f"{'bars':>10} {'naive':>12} {'walk_forward':>14} {'speedup':>9}")
+    for n in args.sizes:
+        df = synthetic_frame(n)
+        t_fast = best_of(lambda: walk_forward_signals(df, ('def',)), repeat=1)
+        sample = min(n, 1_000)
+        t_naive = best_of(lambda: naive_signals(df.iloc[:sample], 'def', "Bearish_Divergence"), repeat=1)
+        # the naive loop is timed on the first 1000 bars and scaled linearly
+        t_naive *= n / sample
+        print(f"{n:>10} {t_naive:>11.1f}s {t_fast * 1e3:>12.1f}ms {t_naive / t_fast:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
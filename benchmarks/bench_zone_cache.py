@@ -0,0 +1,52 @@
+"""
+The examples/app.py confirmation flow (M30+M15, then M15+M5) with and without a shared
+ZoneCache, plus the cache hit/miss counters. Both paths must agree.
+
+    python benchmarks/bench_zone_cache.py [--bars 2000 3500 5000]
+"""
+import argparse
+
+from common import best_of, synthetic_frame
+import divergence_detector as dd
+from indicators import add_macds
+
+
+def app_flow(m30, m15, m5, divergence_type, cache=None):
+    # evaluate both calls (no short-circuit) so the timing covers the full overlap
+    first = dd.check_divergence_conditions(m30, m15, divergence_type, cache=cache)
+    second = dd.check_divergence_conditions(m15, m5, divergence_type, cache=cache)
+    return first, second
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, nargs=3, default=[2_000, 3_500, 5_000])
+    args = parser.parse_args()
+    m30, m15, m5 = (synthetic_frame(n, seed=k) for k, n in enumerate(args.bars))
+
+    for divergence_type in ("Bearish", "Bullish"):
+        assert app_flow(m30, m15, m5, divergence_type) == app_flow(m30, m15, m5, divergence_type, dd.ZoneCache())
+
+    # Custom presets may be lists; a name and its triple share one entry
+    custom = add_macds(m15, [(5, 13, 4)])
+    for key in ('content', 'identity'):
+        cache = dd.ZoneCache(key=key)
+        for macd_cols in ([5, 13, 4], (5, 13, 4), 'def', [12, 26, 9], (12, 26, 9)):
+            expected = dd.check_divergence(custom, "Bearish_Divergence", macd_cols)
+            assert dd.check_divergence(custom, "Bearish_Divergence", macd_cols, cache=cache) == expected, macd_cols
+        assert cache.stats()['misses'] == 2 and cache.stats()['hits'] == 3, cache.stats()
+
+    cache = dd.ZoneCache()
+    app_flow(m30, m15, m5, "Bearish", cache)
+    print("one bar close:", cache.stats())
+
+    t_plain = best_of(lambda: app_flow(m30, m15, m5, "Bearish"), number=20)
+    t_cold = best_of(lambda: app_flow(m30, m15, m5, "Bearish", dd.ZoneCache()), number=20)
+    warm = dd.ZoneCache()
+    app_flow(m30, m15, m5, "Bearish", warm)
+    t_warm = best_of(lambda: app_flow(m30, m15, m5, "Bearish", warm), number=20)
+    print(f"no cache {t_plain * 1e3:.2f}ms, fresh cache {t_cold * 1e3:.2f}ms, warm cache {t_warm * 1e3:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared helpers for the benchmark scripts: seeded synthetic OHLC + MACD frames and a
+small best-of-N timer.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MACD_PARAMS = [(3, 6, 2), (6, 13, 5), (12, 26, 9), (48, 104, 36)]
+
+
+def synthetic_frame(n, seed=0, freq='5min', regime='random'):
+    """
+    Random-walk OHLC bars with the four MACD presets attached the same way examples/app.py does.
+    regime: 'random' (plain random walk), 'choppy' (mean-reverting, MACD zones of a few bars)
+    or 'trending' (walk with a drift held for ~400 bars, MACD zones of hundreds of bars).
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.0005, n)
+    if regime == 'choppy':
+        # Mean-reverting AR(1) level instead of a walk: MACD crosses zero every few bars
+        close = 1.25 + pd.Series(steps).ewm(alpha=0.5, adjust=False).mean().to_numpy()
+    else:
+        if regime == 'trending':
+            # Drift whose sign holds for ~400 bars on average
+            runs = rng.geometric(1.0 / 400, n)
+            steps += np.repeat(np.where(np.arange(n) % 2 == 0, 0.0002, -0.0002), runs)[:n]
+        close = 1.25 + np.cumsum(steps)
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0003, n))
+    df = pd.DataFrame({
+        'time': pd.date_range('2020-01-01', periods=n, freq=freq),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+    })
+    for fast, slow, signal in MACD_PARAMS:
+        fast_ema = df['close'].ewm(span=fast, adjust=False).mean()
+        slow_ema = df['close'].ewm(span=slow, adjust=False).mean()
+        macd_line = fast_ema - slow_ema
+        df[f'macd_{fast}_{slow}_{signal}'] = macd_line
+        df[f'macdS_{fast}_{slow}_{signal}'] = macd_line.ewm(span=signal, adjust=False).mean()
+    return df
+
+
+def best_of(func, repeat=3, number=1):
+    """
+    Best wall time of `repeat` runs, each calling func `number` times; seconds per call.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
@@ -0,0 +1,156 @@
+"""
+Golden-output parity fixtures for the detection functions, on seeded synthetic frames.
+
+The fixtures in golden/golden.json were produced by the original implementations in
+reference.py (calculate_macd_ranges, detect_divergence, check_divergence_conditions,
+find_local_extremes), so any faster engine can be checked against the original semantics.
+calculate_macd_ranges_with_extremes has no correct original (it split long zones and crashed
+on chunks without extremes); its fixture records the current zone-engine output.
+Times are stored as bar positions.
+
+    python benchmarks/golden.py            # check the current code against the fixtures
+    python benchmarks/golden.py --update   # regenerate them (slow: runs the reference loops)
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from common import synthetic_frame
+import divergence_detector as dd
+import reference
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'golden.json')
+REGIMES = ('random', 'choppy', 'trending')
+SIZES = (1_000, 5_000)
+PRESETS = ('low2', 'low1', 'def', 'high')
+CHECKS = ('Bearish_Divergence', 'Bullish_Divergence')
+
+
+def frames(regime, n):
+    return synthetic_frame(n, seed=n, regime=regime), synthetic_frame(n, seed=n + 1, regime=regime)
+
+
+def zones_record(df, zones):
+    return {
+        'start': [int(df.index.get_loc(label)) for label in zones.index],
+        'range_extreme': zones['range_extreme'].tolist(),
+        'macd_extreme': zones['macd_extreme'].tolist(),
+        'range_number': zones['range_number'].tolist(),
+        'extreme_bar': [k if ok else -1 for k, ok in zip(
+            np.searchsorted(df['time'].to_numpy(dtype='datetime64[ns]'), zones['time_extreme'].to_numpy(dtype='datetime64[ns]')).tolist(),
+            zones['time_extreme'].notna().tolist())],
+    }
+
+
+def extremes_record(df, extremes):
+    times = df['time'].to_numpy(dtype='datetime64[ns]')
+    record = {
+        'bar': np.searchsorted(times, extremes['time'].to_numpy(dtype='datetime64[ns]')).tolist(),
+        'macd': extremes['macd_extreme'].tolist(),
+        'price': extremes['price_extreme'].tolist(),
+        'peak': (extremes['type'] == 'peak').tolist(),
+    }
+    if 'range_number' in extremes.columns:
+        record['range_number'] = extremes['range_number'].tolist()
+    return record
+
+
+def reference_conditions(df, lower_df, divergence_type):
+    expected = {
+        "Bearish": ("Bearish Regular Divergence", "Bearish Regular Divergence and Bullish Hidden Divergence"),
+        "Bullish": ("Bullish Regular Divergence", "Bullish Regular Divergence and Bearish Hidden Divergence"),
+    }[divergence_type]
+    for frame in (df, lower_df):
+        for preset in ('def', 'low1'):
+            zones = reference.calculate_macd_ranges(frame, preset, 7)
+            if reference.detect_divergence(zones, f"{divergence_type}_Divergence") in expected:
+                return True
+    return False
+
+
+def reference_extremes(df, macd_col, price_col):
+    try:
+        return reference.find_local_extremes(df, macd_col, price_col)
+    except KeyError:   # the original fails when nothing qualifies
+        return None
+
+
+def build(implementation):
+    """
+    Golden records from implementation 'reference' or 'current'.
+    """
+    cases = {}
+    for regime in REGIMES:
+        for n in SIZES:
+            df, lower_df = frames(regime, n)
+            case = {'close_sum': float(df['close'].sum()), 'presets': {}}
+            for preset in PRESETS:
+                if implementation == 'reference':
+                    zones = reference.calculate_macd_ranges(df, preset, 7)
+                    verdicts = {check: reference.detect_divergence(zones, check) for check in CHECKS}
+                else:
+                    zones = dd.calculate_macd_ranges(df, preset, 7)
+                    verdicts = {check: dd.detect_divergence(zones, check) for check in CHECKS}
+                case['presets'][preset] = {'zones': zones_record(df, zones), 'verdicts': verdicts}
+            for kind in ('Bearish', 'Bullish'):
+                if implementation == 'reference':
+                    case[f'conditions_{kind}'] = reference_conditions(df, lower_df, kind)
+                else:
+                    case[f'conditions_{kind}'] = bool(dd.check_divergence_conditions(df, lower_df, kind))
+            if n == SIZES[0]:
+                if implementation == 'reference':
+                    found = reference_extremes(df, 'macd_12_26_9', 'high')
+                else:
+                    found = dd.find_local_extremes(df, 'macd_12_26_9', 'high')
+                case['extremes'] = extremes_record(df, found) if found is not None and len(found) else None
+                _, with_extremes = dd.calculate_macd_ranges_with_extremes(df, 'def', 7, 20)
+                case['with_extremes'] = extremes_record(df, with_extremes)
+            cases[f'{regime}/{n}'] = case
+    return cases
+
+
+def check(path=PATH):
+    """
+    Compares the current code with the fixtures; returns a list of mismatch descriptions.
+    """
+    with open(path) as handle:
+        golden = json.load(handle)
+    current = build('current')
+    problems = []
+    for name, expected in golden.items():
+        got = current.get(name)
+        if got is None:
+            problems.append(f'{name}: case missing')
+            continue
+        if got['close_sum'] != expected['close_sum']:
+            problems.append(f'{name}: synthetic input changed (generator drift), fixtures need --update')
+            continue
+        for key in expected:
+            if got[key] != expected[key]:
+                problems.append(f'{name}: {key} differs')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--update', action='store_true')
+    args = parser.parse_args()
+    if args.update:
+        os.makedirs(os.path.dirname(PATH), exist_ok=True)
+        with open(PATH, 'w') as handle:
+            json.dump(build('reference'), handle, indent=None, separators=(',', ':'))
+            handle.write('\n')
+        print(f'wrote {PATH}')
+        return
+    problems = check()
+    for problem in problems:
+        print(problem)
+    print('golden: ok' if not problems else f'golden: {len(problems)} mismatches')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
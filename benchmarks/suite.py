@@ -0,0 +1,155 @@
+"""
+Benchmark and regression suite for the detection hot paths.
+
+1. Checks the golden fixtures (golden.py) so a faster engine cannot change the semantics.
+2. Times calculate_macd_ranges (full and early_exit), detect_divergence,
+   check_divergence_conditions, find_local_extremes and calculate_macd_ranges_with_extremes
+   on choppy (MACD zones of a few bars) and trending (hundreds of bars) frames.
+3. Checks the import-time budget and that the BarArrays path never loads pandas
+   (bench_import_time.py).
+4. Fails (exit code 1) when a case is slower than its budget in thresholds.json.
+
+Budgets are stored in calibration units: a case's time divided by the time of a fixed
+NumPy + Python loop (calibrate()) run in the same process, so the same file works on faster
+and slower hosts. Cases without a budget, or a thresholds.json in other units, are reported
+and not failed.
+
+    python benchmarks/suite.py [--sizes 1000 10000 100000 1000000] [--regimes choppy trending]
+    python benchmarks/suite.py --write-thresholds   # budgets = 3x the times measured here
+    python benchmarks/suite.py --backend numba      # same checks on the compiled kernels
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from common import best_of, synthetic_frame
+import bench_import_time
+import divergence_detector as dd
+import golden
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+UNITS = 'calibration'
+HEADROOM = 3.0
+
+
+def calibrate():
+    """
+    Milliseconds of a fixed workload mixing what the cases spend time on: NumPy passes over
+    a large array and an interpreted loop.
+    """
+    values = np.random.default_rng(0).normal(size=200_000)
+
+    def work():
+        np.sort(values)
+        np.cumsum(values)
+        np.flatnonzero(np.diff(np.signbit(values)))
+        total = 0.0
+        for value in values[:20_000].tolist():
+            total += value
+        return total
+
+    return best_of(work, repeat=5, number=5) * 1e3
+
+
+def load_budgets():
+    """
+    Budgets from thresholds.json in calibration units, or ({}, reason) when there are none.
+    """
+    if not os.path.exists(THRESHOLDS):
+        return {}, f'{THRESHOLDS} not found; run with --write-thresholds first'
+    with open(THRESHOLDS) as handle:
+        stored = json.load(handle)
+    if stored.get('units') != UNITS:
+        return {}, f'{THRESHOLDS} holds host-specific milliseconds; rerun with --write-thresholds'
+    return stored['budgets'], None
+
+
+def cases(df, lower_df):
+    zones = dd.calculate_macd_ranges(df, 'def', 7)
+    return {
+        'calculate_macd_ranges': lambda: dd.calculate_macd_ranges(df, 'def', 7),
+        'calculate_macd_ranges[early_exit]': lambda: dd.calculate_macd_ranges(df, 'def', 7, early_exit=True),
+        'detect_divergence': lambda: dd.detect_divergence(zones, "Bearish_Divergence"),
+        'check_divergence_conditions': lambda: dd.check_divergence_conditions(df, lower_df, "Bearish"),
+        'find_local_extremes': lambda: dd.find_local_extremes(df, 'macd_12_26_9', 'high'),
+        'calculate_macd_ranges_with_extremes': lambda: dd.calculate_macd_ranges_with_extremes(df, 'def', 7, 50),
+    }
+
+
+def measure(sizes, regimes):
+    results = {}
+    for regime in regimes:
+        for n in sizes:
+            df = synthetic_frame(n, seed=1, regime=regime)
+            lower_df = synthetic_frame(n, seed=2, regime=regime)
+            for name, func in cases(df, lower_df).items():
+                func()
+                seconds = best_of(func, repeat=3, number=max(1, min(200, 200_000 // n)))
+                results[f'{name}/{regime}/{n}'] = seconds * 1e3
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--regimes', nargs='+', default=['choppy', 'trending'])
+    parser.add_argument('--skip-golden', action='store_true')
+    parser.add_argument('--skip-import-time', action='store_true')
+    parser.add_argument('--write-thresholds', action='store_true')
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'numba'])
+    args = parser.parse_args()
+    print('backend:', dd.set_backend(args.backend))
+
+    failed = False
+    if not args.skip_golden:
+        problems = golden.check()
+        for problem in problems:
+            print(f'GOLDEN {problem}')
+        print('golden fixtures:', 'ok' if not problems else f'{len(problems)} mismatches')
+        failed |= bool(problems)
+
+    if not args.skip_import_time:
+        times, baseline, problems = bench_import_time.check(repeat=3)
+        for problem in problems:
+            print(f'IMPORT {problem}')
+        print(f'import time (numpy {baseline:.1f}ms):',
+              ', '.join(f'{module} {ms:.1f}ms ({fraction:.0%})' for module, (ms, fraction) in times.items()))
+        failed |= bool(problems)
+
+    # Calibrated before and after the cases; the faster run is taken as the host speed
+    calibration = calibrate()
+    results = measure(args.sizes, args.regimes)
+    calibration = min(calibration, calibrate())
+    budgets, reason = load_budgets()
+    print(f'calibration loop: {calibration:.3f}ms')
+    if reason:
+        print(f'BUDGETS {reason}')
+
+    missing = 0
+    print(f"{'case':<58} {'ms/call':>10} {'Mbars/s':>9} {'units':>9} {'budget':>9}")
+    for key, ms in results.items():
+        bars = int(key.rsplit('/', 1)[1])
+        units = ms / calibration
+        budget = budgets.get(key)
+        missing += budget is None
+        slow = budget is not None and units > budget
+        failed |= slow
+        print(f"{key:<58} {ms:>10.3f} {bars / ms / 1e3:>9.1f} {units:>9.3f} "
+              f"{'' if budget is None else f'{budget:.3f}':>9}{'  REGRESSION' if slow else ''}")
+    if missing and not reason:
+        print(f'BUDGETS {missing} cases have no budget; run with --write-thresholds to add them')
+
+    if args.write_thresholds:
+        budgets.update({key: round(ms / calibration * HEADROOM, 4) for key, ms in results.items()})
+        with open(THRESHOLDS, 'w') as handle:
+            json.dump({'units': UNITS, 'budgets': dict(sorted(budgets.items()))}, handle, indent=2)
+            handle.write('\n')
+        print(f'wrote {THRESHOLDS}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+pytest entry point for the correctness checks of the benchmark scripts, so they run in a
+normal test run (python -m pytest) without the timing budgets of suite.py:
+- the golden fixtures (golden.py),
+- the parity self-checks every benchmark script runs before timing, on small sizes,
+- the numba kernels against the numpy ones (skipped when numba is not installed).
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from common import synthetic_frame
+import divergence_detector as dd
+import golden
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Script -> arguments small enough for a test run (the parity checks run before any timing)
+SELF_CHECKS = {
+    'bench_bar_arrays.py': ['--symbols', '2', '--bars', '1000'],
+    'bench_calculate_macd_ranges.py': ['--sizes', '1000', '3000', '--reference-max', '3000'],
+    'bench_chunked.py': ['--bars', '40000', '--chunks', '997', '8192', '--workers', '2'],
+    'bench_compare_zones.py': ['--bars', '3000', '--depths', '7', '20'],
+    'bench_detect_divergence_batch.py': ['--windows', '1000'],
+    'bench_indicators.py': ['--sizes', '2000', '5000'],
+    'bench_local_extremes.py': ['--bars', '50', '1000'],
+    'bench_multi_timeframe.py': ['--queries', '20'],
+    'bench_pipeline.py': ['--symbols', '2', '--latency', '0.001', '0.001', '0.001'],
+    'bench_presets.py': ['--bars', '2000', '--combos', '10'],
+    'bench_scan_universe.py': ['--symbols', '6', '--bars', '2000', '--workers', '1', '2'],
+    'bench_server.py': ['--bars', '2000', '--symbols', '2', '--requests', '200', '--closes', '5'],
+    'bench_streaming.py': ['--sizes', '1000'],
+    'bench_ticks.py': ['--ticks', '20000'],
+    'bench_walk_forward.py': ['--sizes', '600'],
+    'bench_zone_cache.py': [],
+}
+
+
+def test_golden_fixtures():
+    assert golden.check() == []
+
+
+@pytest.mark.parametrize('script', sorted(SELF_CHECKS))
+def test_benchmark_self_checks(script):
+    child = subprocess.run([sys.executable, os.path.join(HERE, script), *SELF_CHECKS[script]],
+                           capture_output=True, text=True, cwd=HERE)
+    assert child.returncode == 0, child.stdout + child.stderr
+
+
+def kernel_inputs():
+    """
+    (high, low, macd) edge cases: empty, one bar, all-NaN MACD and prices, NaN gaps, zeros.
+    """
+    rng = np.random.default_rng(0)
+    high, low, macd = rng.normal(1, 0.1, 500), rng.normal(0, 0.1, 500), rng.normal(0, 1, 500)
+    gaps = macd.copy()
+    gaps[rng.random(500) < 0.1] = np.nan
+    nan = np.full(40, np.nan)
+    return {
+        'empty': (np.empty(0), np.empty(0), np.empty(0)),
+        'one bar': (high[:1], low[:1], macd[:1]),
+        'all-NaN macd': (high[:40], low[:40], nan),
+        'all-NaN prices': (nan, nan, macd[:40]),
+        'NaN gaps': (high, low, gaps),
+        'zeros': (high[:60], low[:60], np.zeros(60)),
+        'random': (high, low, macd),
+    }
+
+
+@pytest.mark.parametrize('case', list(kernel_inputs()))
+def test_numba_kernels_match_numpy(case):
+    kernels_numba = pytest.importorskip('kernels_numba')
+    high, low, macd = kernel_inputs()[case]
+    for got, expected in zip(kernels_numba.macd_zones(high, low, macd), dd._macd_zones_numpy(high, low, macd)):
+        assert got.dtype == expected.dtype
+        np.testing.assert_array_equal(got, expected)
+    for limit_zones in (0, 1, 7, 1000):
+        assert kernels_numba.recent_zones_start(macd, limit_zones) == dd._recent_zones_start_numpy(macd, limit_zones)
+    for m in (1, 2, 5):
+        if len(macd) > 2 * m:
+            for got, expected in zip(kernels_numba.shifted_extremes(macd, m), dd._shifted_extremes_numpy(macd, m)):
+                np.testing.assert_array_equal(got, expected)
+
+
+def test_numba_backend_matches_numpy():
+    pytest.importorskip('numba')
+    df = synthetic_frame(3000, seed=5, regime='choppy')
+    bars = dd.BarArrays.from_frame(df)
+    results = {}
+    try:
+        for backend in ('numpy', 'numba'):
+            dd.set_backend(backend)
+            results[backend] = (
+                dd.calculate_macd_ranges(df, 'def', 7),
+                dd.calculate_macd_ranges(bars[:0], 'def', 7).start,
+                dd.find_local_extremes(df, 'macd_12_26_9', 'high'),
+                dd.calculate_macd_ranges_with_extremes(df, 'low1', 7, 50)[1],
+                dd.check_divergence(df, "Bullish_Divergence", 'low2'),
+            )
+    finally:
+        dd.set_backend('numpy')
+    (zones, empty, extremes, chunked, verdict), expected = results['numba'], results['numpy']
+    assert zones.equals(expected[0]) and extremes.equals(expected[2]) and chunked.equals(expected[3])
+    np.testing.assert_array_equal(empty, expected[1])
+    assert verdict == expected[4]
@@ -0,0 +1,110 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import divergence_detector
+from divergence_detector import BarArrays, _float_column, _macd_column, _macd_zones, _zones_arrays, _zones_frame
+
+
+def calculate_macd_ranges_chunked(df, macd_cols='def', limit_zones=7, chunk=1_048_576, workers=None,
+                                  executor=None):
+    """
+    calculate_macd_ranges(df, macd_cols, limit_zones) for very long series, segmented in
+    blocks of `chunk` bars on a pool. The result is identical to the single-pass one.
+
+    Each block is segmented on its own; a zone that crosses a block edge is stitched back
+    together by merging the running max/min (and its first position) of both sides, and the
+    range numbers are counted from the newest bar. Only `workers * 2` blocks are in flight
+    and only the newest limit_zones zones are kept between blocks, so with BarArrays over a
+    memory map (BarStore.window) peak memory follows the chunk size, not the series length.
+
+    workers: thread-pool size (default os.cpu_count()); NumPy releases the GIL in the
+    reductions, so threads work on views of the arrays without copying them.
+    executor: an existing concurrent.futures executor instead, e.g. a ProcessPoolExecutor
+    (blocks are then pickled to the workers).
+    """
+    inst = divergence_detector._instrumentation
+    started = inst.begin() if inst else None
+    macd = _float_column(df, _macd_column(macd_cols))
+    high, low = _float_column(df, 'high'), _float_column(df, 'low')
+    keep = max(int(np.floor(limit_zones)), 1)
+    workers = os.cpu_count() if workers is None else workers
+
+    if executor is not None:
+        zones = _stitched_zones(high, low, macd, chunk, executor, max(2 * workers, 2), keep)
+    elif workers <= 1 or len(macd) <= chunk:
+        zones = _stitched_zones(high, low, macd, chunk, None, 1, keep)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            zones = _stitched_zones(high, low, macd, chunk, pool, 2 * workers, keep)
+    if inst:
+        inst.record('segment_chunked', started, bars=len(macd), zones=len(zones[0]))
+
+    if isinstance(df, BarArrays):
+        return _zones_arrays(df.time, *zones, limit_zones)
+    return _zones_frame(df, *zones, limit_zones)
+
+
+def _segment_block(high, low, macd, offset):
+    starts, range_extreme, macd_extreme, extreme_pos = _macd_zones(high, low, macd)
+    starts += offset
+    extreme_pos[extreme_pos >= 0] += offset
+    return starts, range_extreme, macd_extreme, extreme_pos
+
+
+def _stitched_zones(high, low, macd, chunk, executor, in_flight, keep=None):
+    """
+    _macd_zones(high, low, macd) computed block by block, in bar order; with keep only the
+    newest `keep` zones are returned (and held between blocks).
+    """
+    n = len(macd)
+    empty = np.empty(0, dtype=np.int64)
+    if n == 0:
+        return empty, np.empty(0), np.empty(0), empty
+    bounds = range(0, n, max(int(chunk), 1))
+
+    def submit(lo):
+        hi = min(lo + chunk, n)
+        if executor is None:
+            return _segment_block(high[lo:hi], low[lo:hi], macd[lo:hi], lo)
+        return executor.submit(_segment_block, high[lo:hi], low[lo:hi], macd[lo:hi], lo)
+
+    parts = []
+    pending = deque()
+    blocks = iter(bounds)
+    for lo in blocks:
+        pending.append((lo, submit(lo)))
+        if len(pending) >= in_flight:
+            break
+    while pending:
+        lo, part = pending.popleft()
+        next_lo = next(blocks, None)
+        if next_lo is not None:
+            pending.append((next_lo, submit(next_lo)))
+        part = part if executor is None else part.result()
+        if parts and (macd[lo] >= 0) == (macd[lo - 1] >= 0):
+            part = _merge_edge(parts[-1], part, macd[lo] >= 0)
+        if len(part[0]):
+            parts.append(part)
+        if keep is not None and sum(len(piece[0]) for piece in parts) > keep + 1:
+            parts = [tuple(np.concatenate(column)[-keep:] for column in zip(*parts))]
+
+    zones = tuple(np.concatenate(column) for column in zip(*parts))
+    return zones if keep is None else tuple(column[-keep:] for column in zones)
+
+
+def _merge_edge(previous, part, positive):
+    """
+    Folds the first zone of part into the last zone of previous (the same zone cut by a
+    block edge) and returns part without it. The earlier side wins ties; NaN never wins.
+    """
+    _, range_extreme, macd_extreme, extreme_pos = previous
+    starts, new_range, new_macd, new_pos = part
+    better = np.greater if positive else np.less
+    if np.isnan(range_extreme[-1]) or better(new_range[0], range_extreme[-1]):
+        range_extreme[-1], extreme_pos[-1] = new_range[0], new_pos[0]
+    if np.isnan(macd_extreme[-1]) or better(new_macd[0], macd_extreme[-1]):
+        macd_extreme[-1] = new_macd[0]
+    return starts[1:], new_range[1:], new_macd[1:], new_pos[1:]
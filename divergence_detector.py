@@ -1,343 +1,1143 @@
+import os
+import threading
+import time
+import tracemalloc
+import warnings
+import weakref
+from collections import OrderedDict
+from enum import IntFlag
+
 import numpy as np
-import pandas as pd
 
+from indicators import PresetSet, macd_block, preset_columns
+
+NAT = np.iinfo(np.int64).min   # int64 value of NaT
+
+_instrumentation = None   # the active Instrumentation, if any
+
+
+class Instrumentation:
+    """
+    Opt-in per-stage timing and counters for the calls made inside a `with` block:
+
+        with Instrumentation() as stats:
+            scan()
+        stats.as_dict()        # {stage: {'calls', 'seconds', 'bars', 'zones', 'alloc_bytes'}}
+        stats.to_prometheus()  # text exposition format
+
+    Stages: 'extract' (reading the columns out of the DataFrame / BarArrays), 'segment' (zone
+    scan), 'zone_table' (building the output), 'evaluate' / 'evaluate_batch' (divergence
+    rules), 'local_extremes', plus the totals of 'check_divergence' and
+    'check_divergence_conditions'. Counters add up over every call in the block, including
+    calls from other threads; process-pool workers are not seen.
+    track_allocations: also record the tracemalloc peak per stage (slow; nested stages reset
+    the peak of the stage around them, so that one is a lower bound).
+    callbacks: functions called as callback(stage, seconds, bars, zones, alloc_bytes).
+    When no Instrumentation is active each stage costs one global lookup.
+    """
+
+    def __init__(self, track_allocations=False, callbacks=()):
+        self.track_allocations = track_allocations
+        self.callbacks = list(callbacks)
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._previous = None
+        self._tracing = False
+
+    def __enter__(self):
+        global _instrumentation
+        self._previous, _instrumentation = _instrumentation, self
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        global _instrumentation
+        _instrumentation = self._previous
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        return False
+
+    def begin(self):
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            return time.perf_counter(), tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), 0
+
+    def record(self, stage, started, bars=0, zones=0):
+        seconds = time.perf_counter() - started[0]
+        alloc = tracemalloc.get_traced_memory()[1] - started[1] if self.track_allocations else 0
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {'calls': 0, 'seconds': 0.0, 'bars': 0, 'zones': 0, 'alloc_bytes': 0}
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['bars'] += int(bars)
+            entry['zones'] += int(zones)
+            entry['alloc_bytes'] = max(entry['alloc_bytes'], alloc)
+        for callback in self.callbacks:
+            callback(stage, seconds, bars, zones, alloc)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
 
+    def as_dict(self):
+        with self._lock:
+            return {stage: dict(entry) for stage, entry in self.stages.items()}
 
-def calculate_macd_ranges(df, macd_cols='def', limit_zones=7):
+    def to_prometheus(self, prefix='macd_divergence'):
+        metrics = (
+            ('calls', 'stage_calls_total', 'counter', 'Calls per stage.'),
+            ('seconds', 'stage_seconds_total', 'counter', 'Wall time spent per stage.'),
+            ('bars', 'stage_bars_total', 'counter', 'Bars processed per stage.'),
+            ('zones', 'stage_zones_total', 'counter', 'MACD zones found per stage.'),
+            ('alloc_bytes', 'stage_alloc_peak_bytes', 'gauge', 'Largest traced allocation peak per stage call.'),
+        )
+        stages = self.as_dict()
+        lines = []
+        for field, name, kind, text in metrics:
+            lines += [f'# HELP {prefix}_{name} {text}', f'# TYPE {prefix}_{name} {kind}']
+            lines += [f'{prefix}_{name}{{stage="{stage}"}} {entry[field]!r}' for stage, entry in stages.items()]
+        return '\n'.join(lines) + '\n'
+
+
+class BarArrays:
+    """
+    Compact bar container accepted by every function in this module in place of a DataFrame.
+    time: int64 epoch nanoseconds; open/high/low/close: contiguous float64;
+    macd: {column name: contiguous float64}, e.g. {'macd_12_26_9': ..., 'macdS_12_26_9': ...}.
+    Slicing (bars[a:b]) returns views, not copies.
+    """
+    __slots__ = ('time', 'open', 'high', 'low', 'close', 'macd', '__weakref__')
+
+    def __init__(self, time, open, high, low, close, macd=None):
+        self.time = np.ascontiguousarray(time, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.macd = {name: np.ascontiguousarray(values, dtype=np.float64) for name, values in (macd or {}).items()}
+
+    @classmethod
+    def from_frame(cls, df, macd_columns=None):
+        """
+        macd_columns: MACD columns to keep (default: every 'macd_*' / 'macdS_*' column).
+        """
+        if macd_columns is None:
+            macd_columns = [column for column in df.columns if str(column).startswith(('macd_', 'macdS_'))]
+        return cls(
+            df['time'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+            df['open'].to_numpy(dtype=np.float64), df['high'].to_numpy(dtype=np.float64),
+            df['low'].to_numpy(dtype=np.float64), df['close'].to_numpy(dtype=np.float64),
+            {column: df[column].to_numpy(dtype=np.float64) for column in macd_columns},
+        )
+
+    def to_frame(self):
+        import pandas as pd
+
+        data = {'time': self.time.view('datetime64[ns]'), 'open': self.open, 'high': self.high,
+                'low': self.low, 'close': self.close}
+        data.update(self.macd)
+        return pd.DataFrame(data)
+
+    def column(self, name):
+        if name in ('open', 'high', 'low', 'close'):
+            return getattr(self, name)
+        if name == 'time':
+            return self.time
+        return self.macd[name]
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        bars = object.__new__(BarArrays)
+        for name in ('time', 'open', 'high', 'low', 'close'):
+            setattr(bars, name, getattr(self, name)[key])
+        bars.macd = {name: values[key] for name, values in self.macd.items()}
+        return bars
+
+
+class Zones:
+    """
+    calculate_macd_ranges output for BarArrays input: one entry per zone, oldest first, for
+    the newest limit_zones zones only. time_extreme is int64 epoch ns (NAT when missing),
+    start is the position of each zone's first bar.
+    """
+    __slots__ = ('range_extreme', 'macd_extreme', 'range_number', 'time_extreme', 'start')
+
+    def __init__(self, range_extreme, macd_extreme, range_number, time_extreme, start):
+        self.range_extreme = range_extreme
+        self.macd_extreme = macd_extreme
+        self.range_number = range_number
+        self.time_extreme = time_extreme
+        self.start = start
+
+    def __len__(self):
+        return len(self.range_extreme)
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            'range_extreme': self.range_extreme,
+            'macd_extreme': self.macd_extreme,
+            'range_number': self.range_number,
+            'time_extreme': self.time_extreme.view('datetime64[ns]'),
+        }, index=self.start)
+
+
+def calculate_macd_ranges(df, macd_cols='def', limit_zones=7, early_exit=False):
     """
     mocd_cols = ["low2 = 3-6-2", "low1 = 6-13-5", "def = 12-26-9", "high = 48-104-36"]
     limit_zones >= 7
+    early_exit = True scans back from the newest bar only until limit_zones sign changes are
+    found; the result is identical but older history is never read.
+    df may be a DataFrame (returns a DataFrame) or BarArrays (returns Zones).
     """
-    params = {
-        "low2": ['macd_3_6_2', 'macdS_3_6_2'],
-        "low1": ['macd_6_13_5', 'macdS_6_13_5'],
-        "def": ['macd_12_26_9', 'macdS_12_26_9'],
-        "high": ['macd_48_104_36', 'macdS_48_104_36'],
-    }
-    
-    if macd_cols not in params:
-        raise ValueError(f"Invalid macd_cols value: '{macd_cols}'. Please choose one of the following options: 'low2', 'low1', 'def', 'high'.")
-    
-    selected_columns = ['time', 'open', 'high', 'close', 'low'] + params[macd_cols]
-    df = df[selected_columns].copy()
-    
-    macd_col = df.columns[5] 
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    macd_col = _macd_column(macd_cols)
+    macd = _float_column(df, macd_col)
+    high, low = _float_column(df, 'high'), _float_column(df, 'low')
+    if inst:
+        inst.record('extract', started, bars=len(macd))
+        started = inst.begin()
+    starts, range_extreme, macd_extreme, extreme_pos = _recent_zones(high, low, macd, limit_zones, early_exit)
+    if inst:
+        inst.record('segment', started, bars=len(macd) - (starts[0] if len(starts) else 0), zones=len(starts))
+        started = inst.begin()
+    if isinstance(df, BarArrays):
+        zones = _zones_arrays(df.time, starts, range_extreme, macd_extreme, extreme_pos, limit_zones)
+    else:
+        zones = _zones_frame(df, starts, range_extreme, macd_extreme, extreme_pos, limit_zones)
+    if inst:
+        inst.record('zone_table', started, zones=len(zones))
+    return zones
 
-    df['macd_sign'] = np.where(df[macd_col] >= 0, 'positive', 'negative')
-    df['range_extreme'] = np.nan
-    df['macd_extreme'] = np.nan
-    df['range_number'] = np.nan
-    df['time_extreme'] = pd.NaT  # ستون جدید برای ذخیره زمان اکسترمم
 
-    current_sign = df['macd_sign'].iloc[-1]
-    range_number = 1
-    start_index = len(df) - 1
-    
-    for i in range(len(df) - 2, -1, -1):
-        if df['macd_sign'].iloc[i] != current_sign:
-            range_df = df.iloc[i+1:start_index+1]
-            
-            if current_sign == 'positive':
-                price_extreme = range_df['high'].max()
-                macd_extreme = range_df[macd_col].max()
-                time_extreme = range_df.loc[range_df['high'].idxmax(), 'time']
-            else:
-                price_extreme = range_df['low'].min()
-                macd_extreme = range_df[macd_col].min()
-                time_extreme = range_df.loc[range_df['low'].idxmin(), 'time']
-            
-            df.loc[i+1:start_index, 'range_extreme'] = price_extreme
-            df.loc[i+1:start_index, 'macd_extreme'] = macd_extreme
-            df.loc[i+1:start_index, 'range_number'] = range_number
-            df.loc[i+1:start_index, 'time_extreme'] = time_extreme
-            
-            current_sign = df['macd_sign'].iloc[i]
-            start_index = i
-            range_number += 1
-    
-    range_df = df.iloc[:start_index+1]
-    if current_sign == 'positive':
-        price_extreme = range_df['high'].max()
-        macd_extreme = range_df[macd_col].max()
-        time_extreme = range_df.loc[range_df['high'].idxmax(), 'time']
-    else:
-        price_extreme = range_df['low'].min()
-        macd_extreme = range_df[macd_col].min()
-        time_extreme = range_df.loc[range_df['low'].idxmin(), 'time']
-    df.loc[:start_index, 'range_extreme'] = price_extreme
-    df.loc[:start_index, 'macd_extreme'] = macd_extreme
-    df.loc[:start_index, 'range_number'] = range_number
-    df.loc[:start_index, 'time_extreme'] = time_extreme
+def _float_column(data, name):
+    if isinstance(data, BarArrays):
+        return data.column(name)
+    return data[name].to_numpy(dtype=np.float64)
+
+
+def _time_values(data):
+    """
+    Bar times as int64 epoch nanoseconds.
+    """
+    if isinstance(data, BarArrays):
+        return data.time
+    return data['time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _ns(value):
+    """
+    A time bound (datetime-like or int64 epoch ns) as int64 epoch nanoseconds.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(np.datetime64(value, 'ns').view(np.int64))
+
+
+def _recent_zones(high, low, macd, limit_zones, early_exit=True):
+    """
+    _macd_zones over the whole arrays, or with early_exit only over the bars of the newest
+    limit_zones zones. Positions are always relative to the full arrays.
+    """
+    first = _recent_zones_start(macd, limit_zones) if early_exit else 0
+    starts, range_extreme, macd_extreme, extreme_pos = _macd_zones(high[first:], low[first:], macd[first:])
+    starts += first
+    extreme_pos[extreme_pos >= 0] += first
+    return starts, range_extreme, macd_extreme, extreme_pos
+
 
-    filtered_df = df[df['range_number'] <= limit_zones]
-    unique_df = filtered_df.drop_duplicates(subset=['range_extreme', 'macd_extreme', 'range_number'], keep='first')
-    return unique_df[['range_extreme', 'macd_extreme', 'range_number', 'time_extreme']]
+def _recent_zones_start(macd, limit_zones):
+    return _backend.recent_zones_start(macd, limit_zones)
+
+
+def _recent_zones_start_numpy(macd, limit_zones, block=256):
+    """
+    Index of the first bar of zone number limit_zones (counted from the newest bar), found by
+    scanning back in growing blocks so the cost depends on the length of the recent zones only.
+    Returns 0 when the history holds fewer zones.
+    """
+    n = len(macd)
+    zones = int(np.floor(limit_zones))
+    if zones < 1:
+        return 0
+    width = block
+    while True:
+        lo = max(n - width, 0)
+        positive = macd[lo:] >= 0
+        changes = np.flatnonzero(positive[1:] != positive[:-1]) + 1
+        if len(changes) >= zones:
+            return lo + int(changes[-zones])
+        if lo == 0:
+            return 0
+        width *= 4
+
+
+def _macd_column(macd_cols):
+    # Preset names come from indicators.MACD_PRESETS (see register_preset); triples work too
+    return preset_columns(macd_cols)[0]
+
+
+def _macd_zones(high, low, macd):
+    return _backend.macd_zones(high, low, macd)
+
+
+def _macd_zones_numpy(high, low, macd):
+    """
+    Run-length segmentation of the MACD sign (macd >= 0 is positive).
+    Returns per-zone arrays ordered oldest first:
+        starts, range_extreme, macd_extreme, extreme_pos
+    Positive zones take max(high)/max(macd), negative zones min(low)/min(macd);
+    extreme_pos is the first bar of the zone holding the price extreme (-1 if all NaN).
+    """
+    n = len(macd)
+    if n == 0:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64),
+                np.empty(0, dtype=np.int64))
+    positive = macd >= 0
+    starts = np.flatnonzero(positive[1:] != positive[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    zone_positive = positive[starts]
+
+    # Negating negative zones turns every min into a max, so one reduction covers both signs
+    sign = np.where(positive, 1.0, -1.0)
+    price = np.where(positive, high, low) * sign
+    range_extreme = np.fmax.reduceat(price, starts)
+    macd_extreme = np.fmax.reduceat(macd * sign, starts)
+
+    lengths = np.diff(np.append(starts, n))
+    zone_id = np.repeat(np.arange(len(starts)), lengths)
+    hits = np.flatnonzero(price == range_extreme[zone_id])
+    hit_zone = zone_id[hits]
+    first = np.ones(len(hits), dtype=bool)
+    first[1:] = hit_zone[1:] != hit_zone[:-1]
+    extreme_pos = np.full(len(starts), -1, dtype=np.int64)
+    extreme_pos[hit_zone[first]] = hits[first]
+
+    zone_sign = np.where(zone_positive, 1.0, -1.0)
+    return starts, range_extreme * zone_sign, macd_extreme * zone_sign, extreme_pos
+
+
+def _zones_frame(df, starts, range_extreme, macd_extreme, extreme_pos, limit_zones):
+    """
+    Builds the calculate_macd_ranges output (one row per zone, labelled by the zone's first bar)
+    for the newest limit_zones zones.
+    """
+    zone_count = len(starts)
+    range_number = (zone_count - np.arange(zone_count)).astype(np.float64)
+    keep = range_number <= limit_zones
+
+    times = df['time'].to_numpy()
+    pos = extreme_pos[keep]
+    time_extreme = times[np.maximum(pos, 0)].astype('datetime64[ns]')
+    time_extreme[pos < 0] = np.datetime64('NaT')
+
+    import pandas as pd
+
+    return pd.DataFrame({
+        'range_extreme': range_extreme[keep],
+        'macd_extreme': macd_extreme[keep],
+        'range_number': range_number[keep],
+        'time_extreme': time_extreme,
+    }, index=df.index[starts[keep]])
+
+
+def _zones_arrays(times, starts, range_extreme, macd_extreme, extreme_pos, limit_zones):
+    zone_count = len(starts)
+    range_number = (zone_count - np.arange(zone_count)).astype(np.float64)
+    keep = range_number <= limit_zones
+    pos = extreme_pos[keep]
+    time_extreme = np.where(pos >= 0, times[np.maximum(pos, 0)], NAT)
+    return Zones(range_extreme[keep], macd_extreme[keep], range_number[keep], time_extreme, starts[keep])
+
+
+class Divergence(IntFlag):
+    """
+    Divergence bitmask; the bit order is the order of the legacy " and "-joined labels.
+    """
+    NONE = 0
+    BEARISH_REGULAR = 1
+    BULLISH_REGULAR = 2
+    BULLISH_HIDDEN = 4
+    BEARISH_HIDDEN = 8
+
+
+_DIVERGENCE_LABELS = (
+    (Divergence.BEARISH_REGULAR, "Bearish Regular Divergence"),
+    (Divergence.BULLISH_REGULAR, "Bullish Regular Divergence"),
+    (Divergence.BULLISH_HIDDEN, "Bullish Hidden Divergence"),
+    (Divergence.BEARISH_HIDDEN, "Bearish Hidden Divergence"),
+)
+
+
+def divergence_label(flags):
+    """
+    Legacy detect_divergence string for a Divergence bitmask.
+    """
+    divergences = [label for flag, label in _DIVERGENCE_LABELS if flags & flag]
+    return " and ".join(divergences) if divergences else "No Divergence"
+
+
+class DivergenceResult:
+    """
+    Outcome of one divergence check: the Divergence flags plus the two zone extremes that
+    were compared (row positions in the zone table, extreme times, prices and MACD values).
+    When a regular and a hidden divergence fire together the extremes are the regular pair;
+    with no divergence they are None.
+    """
+    __slots__ = ('flags', 'newer_index', 'older_index', 'newer_time', 'older_time',
+                 'newer_price', 'older_price', 'newer_macd', 'older_macd')
+
+    def __init__(self, flags=Divergence.NONE, newer_index=None, older_index=None, newer_time=None,
+                 older_time=None, newer_price=None, older_price=None, newer_macd=None, older_macd=None):
+        self.flags = Divergence(flags)
+        self.newer_index = newer_index
+        self.older_index = older_index
+        self.newer_time = newer_time
+        self.older_time = older_time
+        self.newer_price = newer_price
+        self.older_price = older_price
+        self.newer_macd = newer_macd
+        self.older_macd = older_macd
+
+    def __bool__(self):
+        return bool(self.flags)
+
+    def __str__(self):
+        return divergence_label(self.flags)
+
+    def __repr__(self):
+        return (f"DivergenceResult({self.flags!r}, newer_index={self.newer_index}, "
+                f"older_index={self.older_index})")
 
 
 def detect_divergence(df, check_for="Bearish_Divergence"):
-    # Check if the dataframe has at least 6 rows
-    if len(df) < 6:
-        # Instead of raising an error, return "No Divergence" if there is insufficient data
-        return "No Divergence"
+    return str(evaluate_divergence(df, check_for))
+
+
+def evaluate_divergence(df, check_for="Bearish_Divergence"):
+    """
+    detect_divergence returning a DivergenceResult instead of a string.
+    """
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    if isinstance(df, Zones):
+        result = _evaluate_divergence(df.macd_extreme, df.range_extreme, check_for,
+                                      df.time_extreme.view('datetime64[ns]'))
+    else:
+        times = df['time_extreme'].to_numpy() if 'time_extreme' in df.columns else None
+        result = _evaluate_divergence(df['macd_extreme'].to_numpy(), df['range_extreme'].to_numpy(), check_for, times)
+    if inst:
+        inst.record('evaluate', started, zones=len(df))
+    return result
 
-    # Create a copy of df to avoid modifying the original dataframe
-    df_copy = df.copy()
+
+def _evaluate_divergence(macd, price, check_for, times=None):
+    """
+    evaluate_divergence on the zone columns as arrays (oldest zone first).
+    """
+    # Check if the zone table has at least 6 rows
+    if len(macd) < 6:
+        # Instead of raising an error, return "No Divergence" if there is insufficient data
+        return DivergenceResult()
 
     # بررسی شرط‌ها و حذف ردیف آخر در صورت برقرار بودن شرایط
-    if check_for == "Bearish_Divergence" and df_copy['macd_extreme'].iloc[-1] < 0:
-        df_copy = df_copy[:-1]  # حذف ردیف آخر
-    elif check_for == "Bullish_Divergence" and df_copy['macd_extreme'].iloc[-1] > 0:
-        df_copy = df_copy[:-1]  # حذف ردیف آخر
+    if check_for == "Bearish_Divergence" and macd[-1] < 0:
+        macd, price = macd[:-1], price[:-1]  # حذف ردیف آخر
+    elif check_for == "Bullish_Divergence" and macd[-1] > 0:
+        macd, price = macd[:-1], price[:-1]  # حذف ردیف آخر
+
+    flags = Divergence.NONE
+    pair = None
 
     # Bearish Regular Divergence between two recent peaks
-    if (df_copy['macd_extreme'].iloc[-1] > 0 and df_copy['macd_extreme'].iloc[-3] > 0 and
-        df_copy['range_extreme'].iloc[-1] > df_copy['range_extreme'].iloc[-3] and
-        df_copy['macd_extreme'].iloc[-1] < df_copy['macd_extreme'].iloc[-3]):
-        regular_divergence_bearish = "Bearish Regular Divergence"
-    else:
-        regular_divergence_bearish = None
+    if macd[-1] > 0 and macd[-3] > 0 and price[-1] > price[-3] and macd[-1] < macd[-3]:
+        flags |= Divergence.BEARISH_REGULAR
+        pair = (-1, -3)
 
     # Bullish Regular Divergence between two recent troughs
-    if (df_copy['macd_extreme'].iloc[-1] < 0 and df_copy['macd_extreme'].iloc[-3] < 0 and
-        df_copy['range_extreme'].iloc[-1] < df_copy['range_extreme'].iloc[-3] and
-        df_copy['macd_extreme'].iloc[-1] > df_copy['macd_extreme'].iloc[-3]):
-        regular_divergence_bullish = "Bullish Regular Divergence"
-    else:
-        regular_divergence_bullish = None
+    if macd[-1] < 0 and macd[-3] < 0 and price[-1] < price[-3] and macd[-1] > macd[-3]:
+        flags |= Divergence.BULLISH_REGULAR
+        pair = (-1, -3)
 
     # Check for sufficient rows for hidden divergence analysis
-    if len(df_copy) >= 6:
-        # Bullish Hidden Divergence
-        if ((df_copy['macd_extreme'].iloc[-2] < 0 and df_copy['macd_extreme'].iloc[-4] < 0 and
-             df_copy['range_extreme'].iloc[-2] > df_copy['range_extreme'].iloc[-4] and
-             df_copy['macd_extreme'].iloc[-2] < df_copy['macd_extreme'].iloc[-4]) or
-            (df_copy['macd_extreme'].iloc[-2] < 0 and df_copy['macd_extreme'].iloc[-6] < 0 and
-             df_copy['range_extreme'].iloc[-2] > df_copy['range_extreme'].iloc[-6] and
-             df_copy['macd_extreme'].iloc[-2] < df_copy['macd_extreme'].iloc[-6])):
-            hidden_divergence_bullish = "Bullish Hidden Divergence"
-        else:
-            hidden_divergence_bullish = None
-
-        # Bearish Hidden Divergence
-        if ((df_copy['macd_extreme'].iloc[-2] > 0 and df_copy['macd_extreme'].iloc[-4] > 0 and
-             df_copy['range_extreme'].iloc[-2] < df_copy['range_extreme'].iloc[-4] and
-             df_copy['macd_extreme'].iloc[-2] > df_copy['macd_extreme'].iloc[-4]) or
-            (df_copy['macd_extreme'].iloc[-2] > 0 and df_copy['macd_extreme'].iloc[-6] > 0 and
-             df_copy['range_extreme'].iloc[-2] < df_copy['range_extreme'].iloc[-6] and
-             df_copy['macd_extreme'].iloc[-2] > df_copy['macd_extreme'].iloc[-6])):
-            hidden_divergence_bearish = "Bearish Hidden Divergence"
-        else:
-            hidden_divergence_bearish = None
+    if len(macd) >= 6:
+        for older in (-4, -6):
+            # Bullish Hidden Divergence
+            if macd[-2] < 0 and macd[older] < 0 and price[-2] > price[older] and macd[-2] < macd[older]:
+                flags |= Divergence.BULLISH_HIDDEN
+                pair = pair or (-2, older)
+                break
+            # Bearish Hidden Divergence
+            if macd[-2] > 0 and macd[older] > 0 and price[-2] < price[older] and macd[-2] > macd[older]:
+                flags |= Divergence.BEARISH_HIDDEN
+                pair = pair or (-2, older)
+                break
+
+    if pair is None:
+        return DivergenceResult(flags)
+    newer, older = len(macd) + pair[0], len(macd) + pair[1]
+    return DivergenceResult(
+        flags, newer, older,
+        times[newer] if times is not None else None, times[older] if times is not None else None,
+        price[newer], price[older], macd[newer], macd[older],
+    )
+
+
+def detect_divergence_batch(range_extreme, macd_extreme, check_for="Bearish_Divergence", zone_counts=None):
+    """
+    Vectorized evaluate_divergence over many zone tables at once.
+    range_extreme, macd_extreme: arrays of shape [n_windows, limit_zones], oldest zone first and
+    right-aligned (the newest zone in the last column); shorter windows are NaN-padded on the left.
+    zone_counts: real zones per window (default: non-NaN macd_extreme entries per row).
+    Returns an int64 array of Divergence flags, one per window.
+    """
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    flags = _detect_divergence_batch(range_extreme, macd_extreme, check_for, zone_counts)
+    if inst:
+        inst.record('evaluate_batch', started, zones=np.size(macd_extreme))
+    return flags
+
+
+def _detect_divergence_batch(range_extreme, macd_extreme, check_for, zone_counts):
+    price = np.asarray(range_extreme, dtype=np.float64)
+    macd = np.asarray(macd_extreme, dtype=np.float64)
+    windows, width = macd.shape
+    if zone_counts is None:
+        zone_counts = np.count_nonzero(~np.isnan(macd), axis=1)
+    flags = np.zeros(windows, dtype=np.int64)
+    if width < 6 or windows == 0:
+        return flags
+
+    # One NaN column on the left keeps the -6th zone addressable after dropping the last one
+    pad = np.full((windows, 1), np.nan)
+    price = np.hstack([pad, price])
+    macd = np.hstack([pad, macd])
+    rows = np.arange(windows)
+    last = macd[:, -1]
+    if check_for == "Bearish_Divergence":
+        drop = (last < 0).astype(np.int64)
+    elif check_for == "Bullish_Divergence":
+        drop = (last > 0).astype(np.int64)
     else:
-        hidden_divergence_bullish = None
-        hidden_divergence_bearish = None
+        drop = np.zeros(windows, dtype=np.int64)
+    column = width - drop   # the newest zone after the adjustment
 
-    # Compile all results
-    divergences = [d for d in [regular_divergence_bearish, regular_divergence_bullish,
-                               hidden_divergence_bullish, hidden_divergence_bearish] if d]
+    m = {k: macd[rows, column - k + 1] for k in (1, 2, 3, 4, 6)}
+    p = {k: price[rows, column - k + 1] for k in (1, 2, 3, 4, 6)}
+    enough = zone_counts >= 6
+    hidden = enough & (zone_counts - drop >= 6)
 
-    # Return results or indicate no divergence
-    return " and ".join(divergences) if divergences else "No Divergence"
+    regular_bearish = (m[1] > 0) & (m[3] > 0) & (p[1] > p[3]) & (m[1] < m[3])
+    regular_bullish = (m[1] < 0) & (m[3] < 0) & (p[1] < p[3]) & (m[1] > m[3])
+    hidden_bullish = (((m[2] < 0) & (m[4] < 0) & (p[2] > p[4]) & (m[2] < m[4])) |
+                      ((m[2] < 0) & (m[6] < 0) & (p[2] > p[6]) & (m[2] < m[6])))
+    hidden_bearish = (((m[2] > 0) & (m[4] > 0) & (p[2] < p[4]) & (m[2] > m[4])) |
+                      ((m[2] > 0) & (m[6] > 0) & (p[2] < p[6]) & (m[2] > m[6])))
+
+    flags |= np.where(enough & regular_bearish, int(Divergence.BEARISH_REGULAR), 0)
+    flags |= np.where(enough & regular_bullish, int(Divergence.BULLISH_REGULAR), 0)
+    flags |= np.where(hidden & hidden_bullish, int(Divergence.BULLISH_HIDDEN), 0)
+    flags |= np.where(hidden & hidden_bearish, int(Divergence.BEARISH_HIDDEN), 0)
+    return flags
+
+
+REGULAR = Divergence.BEARISH_REGULAR | Divergence.BULLISH_REGULAR
+HIDDEN = Divergence.BULLISH_HIDDEN | Divergence.BEARISH_HIDDEN
+
+# detect_divergence as compare_zones rules: (newer, older, kinds, min_zones), offsets counted
+# from the newest zone (1) of the adjusted table; used with min_zones=6
+LEGACY_RULES = ((1, 3, REGULAR, 3), (2, 4, HIDDEN, 6), (2, 6, HIDDEN, 6))
 
 
-def check_divergence_conditions(df, lower_TF_df, divergence_type="Bearish"):
+class DivergencePairs:
+    """
+    compare_zones output: one entry per divergent (newer, older) zone pair, newest pair first.
+    newer_index / older_index are row positions in the zone table, span = newer - older
+    (zones apart, always even), flags the Divergence kind of each pair. strength is the
+    price move in basis points times the relative MACD move:
+        |price_newer - price_older| / |price_older| * 1e4 * |macd_newer - macd_older| / max(|macd|)
+    """
+    __slots__ = ('flags', 'newer_index', 'older_index', 'span', 'strength', 'newer_time', 'older_time',
+                 'newer_price', 'older_price', 'newer_macd', 'older_macd')
+
+    def __init__(self, flags, newer_index, older_index, strength, times, price, macd):
+        self.flags = flags
+        self.newer_index = newer_index
+        self.older_index = older_index
+        self.span = newer_index - older_index
+        self.strength = strength
+        self.newer_time = times[newer_index] if times is not None else None
+        self.older_time = times[older_index] if times is not None else None
+        self.newer_price, self.older_price = price[newer_index], price[older_index]
+        self.newer_macd, self.older_macd = macd[newer_index], macd[older_index]
+
+    def __len__(self):
+        return len(self.flags)
+
+    def combined(self):
+        """
+        All kinds found, as one Divergence bitmask (evaluate_divergence(...).flags for LEGACY_RULES).
+        """
+        return Divergence(int(np.bitwise_or.reduce(self.flags)) if len(self.flags) else 0)
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            'divergence': [divergence_label(flag) for flag in self.flags],
+            'flags': self.flags,
+            'newer_index': self.newer_index,
+            'older_index': self.older_index,
+            'span': self.span,
+            'strength': self.strength,
+            'newer_time': self.newer_time,
+            'older_time': self.older_time,
+            'newer_price': self.newer_price,
+            'older_price': self.older_price,
+            'newer_macd': self.newer_macd,
+            'older_macd': self.older_macd,
+        })
+
+
+def compare_zones(df, check_for=None, rules=None, max_span=None, min_zones=0):
+    """
+    Every regular / hidden divergence between same-sign zones of a zone table (Zones or the
+    calculate_macd_ranges DataFrame), from one pair of price-vs-MACD difference matrices.
+    Use a large limit_zones (20+) in calculate_macd_ranges to look further back.
+
+    check_for: drops a newest zone of the wrong sign first, as detect_divergence does.
+    rules: only these (newer, older, kinds, min_zones) pairs, offsets counted from the newest
+    zone (1); each applies when the table holds at least min_zones zones. Default: every
+    same-sign pair and every kind. max_span: ignore pairs more than max_span zones apart.
+    min_zones: no pairs at all for a table with fewer zones (before the check_for drop).
+    compare_zones(zones, check_for, LEGACY_RULES, min_zones=6).combined() is
+    evaluate_divergence(zones, check_for).flags.
+    """
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    if isinstance(df, Zones):
+        macd, price, times = df.macd_extreme, df.range_extreme, df.time_extreme.view('datetime64[ns]')
+    else:
+        macd, price = df['macd_extreme'].to_numpy(dtype=np.float64), df['range_extreme'].to_numpy(dtype=np.float64)
+        times = df['time_extreme'].to_numpy() if 'time_extreme' in df.columns else None
+    pairs = _compare_zones(macd, price, times, check_for, rules, max_span, min_zones)
+    if inst:
+        inst.record('compare_zones', started, zones=len(macd))
+    return pairs
+
+
+def _compare_zones(macd, price, times, check_for, rules, max_span, min_zones):
+    if len(macd) < min_zones:
+        macd = price = macd[:0]
+    if len(macd) and check_for == "Bearish_Divergence" and macd[-1] < 0:
+        macd, price = macd[:-1], price[:-1]
+    elif len(macd) and check_for == "Bullish_Divergence" and macd[-1] > 0:
+        macd, price = macd[:-1], price[:-1]
+    n = len(macd)
+
+    # [older, newer] matrices
+    newer_macd, older_macd = macd[None, :], macd[:, None]
+    rising_price = price[None, :] > price[:, None]
+    falling_price = price[None, :] < price[:, None]
+    rising_macd = newer_macd > older_macd
+    falling_macd = newer_macd < older_macd
+    peaks = (newer_macd > 0) & (older_macd > 0)
+    troughs = (newer_macd < 0) & (older_macd < 0)
+    flags = (
+        np.where(peaks & rising_price & falling_macd, int(Divergence.BEARISH_REGULAR), 0)
+        | np.where(troughs & falling_price & rising_macd, int(Divergence.BULLISH_REGULAR), 0)
+        | np.where(troughs & rising_price & falling_macd, int(Divergence.BULLISH_HIDDEN), 0)
+        | np.where(peaks & falling_price & rising_macd, int(Divergence.BEARISH_HIDDEN), 0)
+    )
+    older, newer = np.indices((n, n))
+    allowed = newer > older
+    if max_span is not None:
+        allowed &= newer - older <= max_span
+    if rules is None:
+        flags = np.where(allowed, flags, 0)
+    else:
+        kinds = np.zeros((n, n), dtype=np.int64)
+        for newer_offset, older_offset, rule_kinds, rule_min in rules:
+            if n >= max(rule_min, older_offset):
+                kinds[n - older_offset, n - newer_offset] |= int(rule_kinds)
+        flags = np.where(allowed, flags & kinds, 0)
+
+    # Newest pair first: by newer zone, then by older zone, both descending
+    hits = np.flatnonzero(flags.T[::-1, ::-1])
+    newer_index = n - 1 - hits // max(n, 1)
+    older_index = n - 1 - hits % max(n, 1)
+    new_price, old_price = price[newer_index], price[older_index]
+    new_macd, old_macd = macd[newer_index], macd[older_index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        strength = (np.abs(new_price - old_price) / np.abs(old_price) * 1e4
+                    * np.abs(new_macd - old_macd) / np.maximum(np.abs(new_macd), np.abs(old_macd)))
+    return DivergencePairs(flags[older_index, newer_index], newer_index, older_index,
+                           np.nan_to_num(strength, nan=0.0, posinf=0.0), times, price, macd)
+
+
+class ZoneCache:
+    """
+    LRU cache of calculate_macd_ranges(..., early_exit=True) results (DataFrame or Zones,
+    following the input), so overlapping
+    multi-timeframe checks within one bar close segment every frame/preset only once.
+
+    Entries are keyed by (frame key, last bar time, MACD column, limit_zones), so a preset name
+    and its (fast, slow, signal) triple or list share one entry. With
+    key='content' the frame key is a fingerprint of its length, first bar time and the
+    high/low/MACD values of the last `tail` bars, so equal copies of a frame share entries;
+    with key='identity' it is the frame object itself (held through a weak reference).
+    Frames are assumed to be append-only history: editing old bars in place without
+    touching the tail is not detected.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=16 * 2**20, key='content', tail=256):
+        if key not in ('content', 'identity'):
+            raise ValueError(f"Invalid key value: '{key}'. Please choose 'content' or 'identity'.")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.key = key
+        self.tail = tail
+        self.clear()
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def zones(self, df, macd_cols='def', limit_zones=7):
+        """
+        calculate_macd_ranges(df, macd_cols, limit_zones, early_exit=True), cached.
+        The returned frame is shared between callers and must not be modified.
+        """
+        key, ref = self._key(df, macd_cols, limit_zones)
+        entry = self._entries.get(key)
+        if entry is not None and (ref is None or entry[0]() is df):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        zones = calculate_macd_ranges(df, macd_cols=macd_cols, limit_zones=limit_zones, early_exit=True)
+        size = 40 * len(zones) + 512   # four 8-byte columns + index/start per zone, plus overhead
+        if entry is not None:
+            self._drop(key)
+        self._entries[key] = (ref, zones, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        return zones
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def _key(self, df, macd_cols, limit_zones):
+        # The resolved column, not macd_cols itself: list presets are unhashable
+        macd_col = _macd_column(macd_cols)
+        times = _time_values(df)
+        last_time = int(times[-1]) if len(times) else None
+        if self.key == 'identity':
+            return (id(df), last_time, macd_col, limit_zones), weakref.ref(df)
+        import hashlib
+
+        digest = hashlib.blake2b(digest_size=16)
+        for column in ('high', 'low', macd_col):
+            digest.update(np.ascontiguousarray(_float_column(df, column)[-self.tail:]).tobytes())
+        first_time = int(times[0]) if len(times) else None
+        return (len(times), first_time, digest.digest(), last_time, macd_col, limit_zones), None
+
+
+def check_divergence_conditions(df, lower_TF_df, divergence_type="Bearish", cache=None):
     """
     بررسی واگرایی با توجه به نوع ورودی
     
     پارامترها:
-    df (DataFrame): داده‌های اصلی تایم فریم بالا
-    lower_TF_df (DataFrame): داده‌های تایم فریم پایین‌تر
+    df (DataFrame | BarArrays): داده‌های اصلی تایم فریم بالا
+    lower_TF_df (DataFrame | BarArrays): داده‌های تایم فریم پایین‌تر
     divergence_type (str): نوع واگرایی، می‌تواند "Bearish" یا "Bullish" باشد
+    cache (ZoneCache): کش مشترک محدوده‌ها بین فراخوانی‌ها (اختیاری)
     
     خروجی:
     bool: اگر حداقل یکی از شرایط واگرایی برقرار باشد، مقدار True برمی‌گرداند و در غیر این صورت False
     """
-    # انواع واگرایی‌های موجود
-    divergence_types = ["Bearish", "Bullish"]
+    inst = _instrumentation
+    started = inst.begin() if inst else None
     check_for = f"{divergence_type}_Divergence"
-    
-    # تنظیم نتایج مورد انتظار بر اساس نوع واگرایی
-    if divergence_type == divergence_types[0]:  # Bearish
-        expected_results = [
-            f"{divergence_types[0]} Regular Divergence", 
-            f"{divergence_types[0]} Regular Divergence and {divergence_types[1]} Hidden Divergence"
-        ]
-    else:  # Bullish
-        expected_results = [
-            f"{divergence_types[1]} Regular Divergence", 
-            f"{divergence_types[1]} Regular Divergence and {divergence_types[0]} Hidden Divergence"
-        ]
-
-    # محاسبه واگرایی برای شرایط مختلف
-    conditions = [
-        calculate_macd_ranges(df, macd_cols='def', limit_zones=7),
-        calculate_macd_ranges(df, macd_cols='low1', limit_zones=7),
-        calculate_macd_ranges(lower_TF_df, macd_cols='def', limit_zones=7),
-        calculate_macd_ranges(lower_TF_df, macd_cols='low1', limit_zones=7)
-    ]
-
-    # بررسی هر شرط و ارزیابی نتیجه
-    for condition in conditions:
-        divergence_result = detect_divergence(condition, check_for=check_for)
-        if divergence_result in expected_results:
-            return True  # حداقل یکی از شرایط درست است
-
-    return False  # هیچ شرطی برقرار نیست
+    expected_flags = _confirmation_flags(divergence_type)
 
+    # محاسبه واگرایی برای شرایط مختلف (فقط در صورت نیاز)
+    conditions = [(df, 'def'), (df, 'low1'), (lower_TF_df, 'def'), (lower_TF_df, 'low1')]
 
+    # بررسی هر شرط و ارزیابی نتیجه
+    confirmed = False
+    for frame, macd_cols in conditions:
+        if cache is not None:
+            zones = cache.zones(frame, macd_cols=macd_cols, limit_zones=7)
+        else:
+            zones = calculate_macd_ranges(frame, macd_cols=macd_cols, limit_zones=7, early_exit=True)
+        divergence_result = evaluate_divergence(zones, check_for=check_for)
+        if divergence_result.flags in expected_flags:
+            confirmed = True  # حداقل یکی از شرایط درست است
+            break
 
+    if inst:
+        inst.record('check_divergence_conditions', started, bars=len(df) + len(lower_TF_df))
+    return confirmed  # False: هیچ شرطی برقرار نیست
 
 
+def _confirmation_flags(divergence_type):
+    """
+    Divergence flags that confirm a "Bearish" / "Bullish" setup in check_divergence_conditions.
+    """
+    # تنظیم نتایج مورد انتظار بر اساس نوع واگرایی
+    if divergence_type == "Bearish":
+        return (Divergence.BEARISH_REGULAR, Divergence.BEARISH_REGULAR | Divergence.BULLISH_HIDDEN)
+    # Bullish
+    return (Divergence.BULLISH_REGULAR, Divergence.BULLISH_REGULAR | Divergence.BEARISH_HIDDEN)
 
 
-def check_divergence(df, check_for = "Bearish_Divergence", macd_cols='def', limit_zones=7):
+def check_divergence(df, check_for = "Bearish_Divergence", macd_cols='def', limit_zones=7, cache=None):
     """
     check_for = ["Bearish_Divergence", "Bullish_Divergence"]
     mocd_cols = ["low2 = 3-6-2", "low1 = 6-13-5", "def = 12-26-9", "high = 48-104-36"]
     limit_zones >= 7
+    cache = optional ZoneCache shared between calls
     """
-    df1 = calculate_macd_ranges(df, macd_cols = macd_cols, limit_zones = limit_zones)
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    if cache is not None:
+        df1 = cache.zones(df, macd_cols = macd_cols, limit_zones = limit_zones)
+    else:
+        df1 = calculate_macd_ranges(df, macd_cols = macd_cols, limit_zones = limit_zones, early_exit = True)
     result = detect_divergence(df1, check_for = check_for)
+    if inst:
+        inst.record('check_divergence', started, bars=len(df))
     return result
 
 
+def evaluate_presets(df, presets, check_for="Bearish_Divergence", limit_zones=7):
+    """
+    check_divergence for many presets over the same bars in one batch, e.g. a parameter sweep:
+    evaluate_presets(df, [(fast, slow, 9) for fast in range(4, 14) for slow in range(20, 30)]).
+    presets: preset names and/or (fast, slow, signal) triples, or a PresetSet resolved once.
+    MACD columns already in df are used as they are; the missing ones are computed from
+    'close' in one indicators.macd_block pass. high / low are read once for all presets.
+    Returns an int64 array of Divergence flags, one per preset, in order.
+    """
+    if not isinstance(presets, PresetSet):
+        presets = PresetSet(presets)
+    zones = max(int(np.floor(limit_zones)), 0)
+    price = np.full((len(presets), zones), np.nan)
+    macd_table = np.full((len(presets), zones), np.nan)
+    counts = np.zeros(len(presets), dtype=np.int64)
+    if len(df) == 0:
+        return counts
+
+    available = df.macd if isinstance(df, BarArrays) else df.columns
+    missing = [k for k, column in enumerate(presets.columns) if column not in available]
+    if missing:
+        block, _ = macd_block(_float_column(df, 'close'), PresetSet([presets.triples[k] for k in missing]))
+    high, low = _float_column(df, 'high'), _float_column(df, 'low')
+    for k, column in enumerate(presets.columns):
+        macd = block[:, 2 * missing.index(k)] if k in missing else _float_column(df, column)
+        _, range_extreme, macd_extreme, _ = _recent_zones(high, low, macd, limit_zones)
+        counts[k] = count = min(len(macd_extreme), zones)
+        price[k, zones - count:] = range_extreme[len(range_extreme) - count:]
+        macd_table[k, zones - count:] = macd_extreme[len(macd_extreme) - count:]
+    return detect_divergence_batch(price, macd_table, check_for, counts)
+
+
 # /////// Advanced
 
-def find_local_extremes(df, macd_col, price_col, min_candles=2):
+class Extremes:
+    """
+    find_local_extremes output for BarArrays input: one entry per extreme in bar order.
+    index is the bar position, time is int64 epoch ns, is_peak is False for troughs.
+    range_number is set by calculate_macd_ranges_with_extremes only.
+    """
+    __slots__ = ('index', 'time', 'macd', 'price', 'is_peak', 'range_number')
+
+    def __init__(self, index, time, macd, price, is_peak, range_number=None):
+        self.index = index
+        self.time = time
+        self.macd = macd
+        self.price = price
+        self.is_peak = is_peak
+        self.range_number = range_number
+
+    def __len__(self):
+        return len(self.index)
+
+    def to_frame(self):
+        import pandas as pd
+
+        frame = pd.DataFrame({
+            'time': self.time.view('datetime64[ns]'),
+            'macd_extreme': self.macd,
+            'price_extreme': self.price,
+            'type': np.where(self.is_peak, 'peak', 'trough').astype(object),
+        })
+        if self.range_number is not None:
+            frame['range_number'] = self.range_number
+        return frame
+
+
+def find_local_extremes(df, macd_col, price_col, min_candles=2, prominence=None, distance=None):
     """
     این تابع نقاط بیشینه و کمینه محلی در یک محدوده طولانی MACD را برمی‌گرداند.
     ورودی‌ها:
-        - df: دیتافریم شامل ستون MACD و قیمت
+        - df: دیتافریم شامل ستون MACD و قیمت (یا BarArrays)
         - macd_col: نام ستون MACD
         - price_col: نام ستون قیمت (high یا low بسته به جهت MACD)
         - min_candles: تعداد حداقل کندل‌هایی که باید بین قله‌ها و دره‌ها فاصله باشد (برای صاف‌کردن)
+        - prominence: حداقل فاصله MACD قله/دره از بلندترین/پایین‌ترین کندل مقایسه (اختیاری)
+        - distance: حداقل فاصله (تعداد کندل) بین دو قله یا دو دره؛ قوی‌تر می‌ماند (اختیاری)
     خروجی:
         - یک دیتافریم شامل زمان، مقدار MACD و قیمت در قله‌ها و دره‌ها
+          (برای ورودی BarArrays یک Extremes)
     """
-    extremes = []
-    
-    # بررسی روند تغییرات MACD برای شناسایی قله‌ها و دره‌ها
-    for i in range(min_candles, len(df) - min_candles):
-        # بررسی قله محلی
-        if df[macd_col].iloc[i] > df[macd_col].iloc[i - min_candles] and df[macd_col].iloc[i] > df[macd_col].iloc[i + min_candles]:
-            extremes.append({
-                'time': df['time'].iloc[i],
-                'macd_extreme': df[macd_col].iloc[i],
-                'price_extreme': df[price_col].iloc[i],
-                'type': 'peak'
-            })
-        
-        # بررسی دره محلی
-        elif df[macd_col].iloc[i] < df[macd_col].iloc[i - min_candles] and df[macd_col].iloc[i] < df[macd_col].iloc[i + min_candles]:
-            extremes.append({
-                'time': df['time'].iloc[i],
-                'macd_extreme': df[macd_col].iloc[i],
-                'price_extreme': df[price_col].iloc[i],
-                'type': 'trough'
-            })
-
-    # تبدیل لیست به دیتافریم برای خروجی
-    extremes_df = pd.DataFrame(extremes)
-    return extremes_df[['time', 'macd_extreme', 'price_extreme', 'type']]
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    macd = _float_column(df, macd_col)
+    index, is_peak = _local_extremes(macd, min_candles, prominence, distance)
+    price = _float_column(df, price_col)[index]
+    if isinstance(df, BarArrays):
+        extremes = Extremes(index, df.time[index], macd[index], price, is_peak)
+    else:
+        import pandas as pd
 
+        extremes = pd.DataFrame({
+            'time': df['time'].take(index).reset_index(drop=True),
+            'macd_extreme': macd[index],
+            'price_extreme': price,
+            'type': np.where(is_peak, 'peak', 'trough').astype(object),
+        })
+    if inst:
+        inst.record('local_extremes', started, bars=len(macd))
+    return extremes
 
 
-import numpy as np
-import pandas as pd
+def _local_extremes(macd, min_candles=2, prominence=None, distance=None):
+    """
+    Positions i in [min_candles, n - min_candles) where macd[i] is strictly above (peak) or
+    below (trough) both macd[i - min_candles] and macd[i + min_candles], with shifted-array
+    comparisons; NaN never qualifies. prominence is the smaller of the two gaps to those
+    reference bars. distance keeps, among extremes of one kind closer than distance bars,
+    only the strongest (the first on ties).
+    """
+    m = int(min_candles)
+    n = len(macd) - 2 * m
+    if m < 0 or n <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+    center, left, right = macd[m:m + n], macd[:n], macd[2 * m:]
+    peak, trough = _shifted_extremes(macd, m)
+    if prominence is not None:
+        gap = np.minimum(np.abs(center - left), np.abs(center - right))
+        strong = gap >= prominence
+        peak &= strong
+        trough &= strong
+    if distance is not None and distance > 1:
+        peak &= _strongest_within(np.where(peak, center, -np.inf), int(distance))
+        trough &= _strongest_within(np.where(trough, -center, -np.inf), int(distance))
+    index = np.flatnonzero(peak | trough)
+    return index + m, peak[index]
+
+
+def _shifted_extremes(macd, m):
+    return _backend.shifted_extremes(macd, m)
+
+
+def _shifted_extremes_numpy(macd, m):
+    """
+    Peak and trough masks for the centres macd[m:len - m] against the bars m before and after.
+    """
+    n = len(macd) - 2 * m
+    center, left, right = macd[m:m + n], macd[:n], macd[2 * m:]
+    peak = (center > left) & (center > right)
+    trough = (center < left) & (center < right) & ~peak
+    return peak, trough
+
+
+def _strongest_within(values, distance):
+    """
+    True where values[i] beats every value in the distance - 1 bars before it and is not
+    beaten by any in the distance - 1 bars after it.
+    """
+    pad = np.full(distance - 1, -np.inf)
+    windows = np.lib.stride_tricks.sliding_window_view(np.concatenate((pad, values, pad)), distance - 1)
+    n = len(values)
+    return (values > windows[:n].max(axis=1)) & (values >= windows[distance:distance + n].max(axis=1))
 
 def calculate_macd_ranges_with_extremes(df, macd_cols='def', limit_zones=7, max_candle_count=50):
     """
     تابع اصلی که با رسیدن به 50 کندل، قله و دره‌های مکدی را شناسایی می‌کند
+    Returns (zones, extremes): zones is exactly calculate_macd_ranges(df, macd_cols, limit_zones).
+    Every zone with at least max_candle_count bars is cut, from its newest bar back, into
+    max_candle_count-bar chunks (a shorter oldest remainder is skipped), and find_local_extremes
+    runs inside each full chunk. extremes lists them in bar order with the range_number of
+    their zone. Both come from one segmentation pass; BarArrays input gives (Zones, Extremes).
     """
-    params = {
-        "low2": ['macd_3_6_2', 'macdS_3_6_2'],
-        "low1": ['macd_6_13_5', 'macdS_6_13_5'],
-        "def": ['macd_12_26_9', 'macdS_12_26_9'],
-        "high": ['macd_48_104_36', 'macdS_48_104_36'],
-    }
+    inst = _instrumentation
+    started = inst.begin() if inst else None
+    macd_col = _macd_column(macd_cols)
+    macd = _float_column(df, macd_col)
+    high, low = _float_column(df, 'high'), _float_column(df, 'low')
+    if inst:
+        inst.record('extract', started, bars=len(macd))
+        started = inst.begin()
+    starts, range_extreme, macd_extreme, extreme_pos = _recent_zones(high, low, macd, limit_zones)
+    if inst:
+        inst.record('segment', started, bars=len(macd), zones=len(starts))
+        started = inst.begin()
+
+    index, is_peak, zone = _chunk_extremes(macd, starts, limit_zones, max_candle_count)
+    price = np.where(macd[index] >= 0, high[index], low[index])
+    range_number = (len(starts) - zone).astype(np.float64)
+    if inst:
+        inst.record('local_extremes', started, bars=len(macd) - (starts[0] if len(starts) else 0))
+        started = inst.begin()
+
+    if isinstance(df, BarArrays):
+        zones = _zones_arrays(df.time, starts, range_extreme, macd_extreme, extreme_pos, limit_zones)
+        extremes = Extremes(index, df.time[index], macd[index], price, is_peak, range_number)
+    else:
+        import pandas as pd
+
+        zones = _zones_frame(df, starts, range_extreme, macd_extreme, extreme_pos, limit_zones)
+        extremes = pd.DataFrame({
+            'time': df['time'].take(index).reset_index(drop=True),
+            'macd_extreme': macd[index],
+            'price_extreme': price,
+            'type': np.where(is_peak, 'peak', 'trough').astype(object),
+            'range_number': range_number,
+        })
+    if inst:
+        inst.record('zone_table', started, zones=len(zones))
+    return zones, extremes
+
+
+def merge_zone_extremes(zones, extremes):
+    """
+    The zone table annotated with its local extremes, from calculate_macd_ranges_with_extremes:
+    one row per (zone, extreme) in zone then bar order, still labelled by the zone's first bar;
+    a zone without extremes keeps one row with NaN / NaT extreme columns.
+    Extreme columns: local_time, local_macd, local_price, local_type ('peak' / 'trough').
+    (Zones, Extremes) from BarArrays input are converted with to_frame() first.
+    """
+    if not hasattr(zones, 'columns'):
+        zones, extremes = zones.to_frame(), extremes.to_frame()
+    extremes = extremes.rename(columns={'time': 'local_time', 'macd_extreme': 'local_macd',
+                                        'price_extreme': 'local_price', 'type': 'local_type'})
+    return zones.join(extremes.set_index('range_number'), on='range_number', how='left')
+
+def _chunk_extremes(macd, starts, limit_zones, max_candle_count, min_candles=2):
+    """
+    _local_extremes restricted to the full max_candle_count-bar chunks of the newest
+    limit_zones zones: both comparison bars must lie in the same chunk as the extreme.
+    Returns positions, is_peak and the zone (index into starts) of each extreme.
+    """
+    n = len(macd)
+    length = max(int(max_candle_count), 1)
+    m = int(min_candles)
+    first_zone = max(len(starts) - int(np.floor(limit_zones)), 0)
+    if first_zone >= len(starts) or n - starts[first_zone] < length:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), np.empty(0, dtype=np.int64)
 
-    if macd_cols not in params:
-        raise ValueError(f"Invalid macd_cols value: '{macd_cols}'. Please choose one of the following options: 'low2', 'low1', 'def', 'high'.")
-
-    selected_columns = ['time', 'open', 'high', 'close', 'low'] + params[macd_cols]
-    df = df[selected_columns].copy()
-
-    macd_col = df.columns[5] 
-
-    df['macd_sign'] = np.where(df[macd_col] >= 0, 'positive', 'negative')
-    df['range_extreme'] = np.nan
-    df['macd_extreme'] = np.nan
-    df['range_number'] = np.nan
-    df['time_extreme'] = pd.NaT
-
-    current_sign = df['macd_sign'].iloc[-1]
-    range_number = 1
-    start_index = len(df) - 1
-    candle_count = 0
-    all_extremes = []  # لیست برای ذخیره قله‌ها و دره‌ها
-
-    for i in range(len(df) - 2, -1, -1):
-        candle_count += 1
-
-        # اگر تغییر علامت داشتیم یا به محدودیت کندل رسیدیم
-        if df['macd_sign'].iloc[i] != current_sign or candle_count >= max_candle_count:
-            range_df = df.iloc[i+1:start_index+1]
-            
-            if current_sign == 'positive':
-                price_extreme = range_df['high'].max()
-                macd_extreme = range_df[macd_col].max()
-                time_extreme = range_df.loc[range_df['high'].idxmax(), 'time']
-                price_col = 'high'
-            else:
-                price_extreme = range_df['low'].min()
-                macd_extreme = range_df[macd_col].min()
-                time_extreme = range_df.loc[range_df['low'].idxmin(), 'time']
-                price_col = 'low'
-
-            df.loc[i+1:start_index, 'range_extreme'] = price_extreme
-            df.loc[i+1:start_index, 'macd_extreme'] = macd_extreme
-            df.loc[i+1:start_index, 'range_number'] = range_number
-            df.loc[i+1:start_index, 'time_extreme'] = time_extreme
-
-            # ارسال داده‌ها به تابع کمکی اگر تعداد کندل‌ها از حد مجاز بیشتر بود
-            if candle_count >= max_candle_count:
-                extremes_df = find_local_extremes(range_df, macd_col, price_col)
-                all_extremes.append(extremes_df)
-
-            current_sign = df['macd_sign'].iloc[i]
-            start_index = i
-            range_number += 1
-            candle_count = 0  # Reset candle count for new range
-
-    # آخرین محدوده
-    range_df = df.iloc[:start_index+1]
-    if current_sign == 'positive':
-        price_extreme = range_df['high'].max()
-        macd_extreme = range_df[macd_col].max()
-        time_extreme = range_df.loc[range_df['high'].idxmax(), 'time']
+    lo = starts[first_zone]
+    zone_starts = starts[first_zone:]
+    zone_ends = np.append(zone_starts[1:], n) - 1
+    pos = np.arange(lo, n)
+    zone = np.repeat(np.arange(first_zone, len(starts)), zone_ends - zone_starts + 1)
+    chunk_end = zone_ends[zone - first_zone]
+    chunk_end = chunk_end - (chunk_end - pos) // length * length
+    chunk_start = chunk_end - length + 1
+    inside = (chunk_start >= starts[zone]) & (pos - m >= chunk_start) & (pos + m <= chunk_end)
+
+    peak = np.zeros(n - lo, dtype=bool)
+    trough = np.zeros(n - lo, dtype=bool)
+    if n - lo > 2 * m:
+        peak[m:n - lo - m], trough[m:n - lo - m] = _shifted_extremes(macd[lo:], m)
+    hits = np.flatnonzero((peak | trough) & inside)
+    return hits + lo, peak[hits], zone[hits]
+
+
+# /////// Backends
+
+class _Backend:
+    """
+    The kernels behind segmentation (macd_zones), the early-exit scan (recent_zones_start)
+    and local extreme detection (shifted_extremes).
+    """
+    __slots__ = ('name', 'macd_zones', 'recent_zones_start', 'shifted_extremes')
+
+    def __init__(self, name, macd_zones, recent_zones_start, shifted_extremes):
+        self.name = name
+        self.macd_zones = macd_zones
+        self.recent_zones_start = recent_zones_start
+        self.shifted_extremes = shifted_extremes
+
+
+_backend = _Backend('numpy', _macd_zones_numpy, _recent_zones_start_numpy, _shifted_extremes_numpy)
+
+
+def set_backend(backend="numpy"):
+    """
+    Selects the kernels used by every function in this module: "numpy" (default) or "numba"
+    (optional extra: pip install numba). Falls back to "numpy" with a RuntimeWarning when
+    Numba is not installed. The MACD_DIVERGENCE_BACKEND environment variable sets it at
+    import, which also covers pool workers. Returns the backend now in use.
+    """
+    global _backend
+    if backend == "numpy":
+        _backend = _Backend('numpy', _macd_zones_numpy, _recent_zones_start_numpy, _shifted_extremes_numpy)
+    elif backend == "numba":
+        try:
+            import kernels_numba
+        except ImportError:
+            warnings.warn("Numba is not installed; using the numpy backend", RuntimeWarning, stacklevel=2)
+            return set_backend("numpy")
+        _backend = _Backend('numba', kernels_numba.macd_zones, kernels_numba.recent_zones_start,
+                            kernels_numba.shifted_extremes)
     else:
-        price_extreme = range_df['low'].min()
-        macd_extreme = range_df[macd_col].min()
-        time_extreme = range_df.loc[range_df['low'].idxmin(), 'time']
-    df.loc[:start_index, 'range_extreme'] = price_extreme
-    df.loc[:start_index, 'macd_extreme'] = macd_extreme
-    df.loc[:start_index, 'range_number'] = range_number
-    df.loc[:start_index, 'time_extreme'] = time_extreme
+        raise ValueError(f"Invalid backend value: '{backend}'. Please choose one of the following options: 'numpy', 'numba'.")
+    return _backend.name
 
-    # در صورت وجود محدوده بلند، شناسایی قله‌ها و دره‌ها
-    if len(range_df) >= max_candle_count:
-        extremes_df = find_local_extremes(range_df, macd_col, price_col)
-        all_extremes.append(extremes_df)
 
-    # تجمیع تمامی قله‌ها و دره‌ها
-    all_extremes_df = pd.concat(all_extremes, ignore_index=True) if all_extremes else pd.DataFrame()
+def get_backend():
+    return _backend.name
 
-    # خروجی نهایی
-    return df, all_extremes_df[['time', 'macd_extreme', 'price_extreme', 'type']]
 
+if os.environ.get('MACD_DIVERGENCE_BACKEND'):
+    set_backend(os.environ['MACD_DIVERGENCE_BACKEND'])
 
 
 if __name__ == "__main__":
+    import pandas as pd
+
     # نمونه‌ای از داده‌ها برای آزمایش
     data = {
         'time': pd.date_range(start="2024-10-11", periods=20, freq='H'),  # افزایش تعداد سطرها به 20
@@ -0,0 +1,197 @@
+import numpy as np
+
+MACD_PRESETS = {
+    "low2": (3, 6, 2),
+    "low1": (6, 13, 5),
+    "def": (12, 26, 9),
+    "high": (48, 104, 36),
+}
+_columns = {}   # preset -> (macd column, signal column), cleared by register_preset
+
+
+def register_preset(name, fast, slow, signal):
+    """
+    Adds (or replaces) a named preset, usable wherever 'low2' / 'low1' / 'def' / 'high' are,
+    e.g. register_preset('scalp', 5, 13, 4) then calculate_macd_ranges(df, 'scalp').
+    Its columns are named like the built-in ones: 'macd_5_13_4' / 'macdS_5_13_4'.
+    """
+    MACD_PRESETS[name] = resolve_preset((fast, slow, signal))
+    _columns.clear()
+    return MACD_PRESETS[name]
+
+
+class PresetSet:
+    """
+    A fixed list of presets (names and/or (fast, slow, signal) triples) resolved once: the
+    triples, their column names and the EMA spans they share. Pass it instead of the list to
+    macd_block or evaluate_presets when the same presets are used on every call, e.g. a sweep.
+    """
+    __slots__ = ('presets', 'triples', 'columns', 'signal_columns', 'spans')
+
+    def __init__(self, presets):
+        self.presets = tuple(presets)
+        self.triples = [resolve_preset(preset) for preset in self.presets]
+        self.columns = [f'macd_{fast}_{slow}_{signal}' for fast, slow, signal in self.triples]
+        self.signal_columns = [f'macdS_{fast}_{slow}_{signal}' for fast, slow, signal in self.triples]
+        self.spans = sorted({span for fast, slow, _ in self.triples for span in (fast, slow)})
+
+    def __len__(self):
+        return len(self.triples)
+
+    def __iter__(self):
+        return iter(self.presets)
+
+
+def macd_block(close, presets=("low2", "low1", "def", "high"), out=None, state=None):
+    """
+    MACD and signal lines for several presets in one fused pass over close.
+    presets: preset names from MACD_PRESETS and/or custom (fast, slow, signal) triples, or a
+    PresetSet.
+    Returns (block, columns): block is a column-major float64 (n, 2 * len(presets)) array
+    holding [macd, macdS] per preset, columns are the matching 'macd_f_s_g' / 'macdS_f_s_g'
+    names. Values match pandas ewm(span=..., adjust=False).mean().
+    state: optional dict of the EMA values before close[0] ('ema_<span>' and the 'macdS_*'
+    names), updated in place with the values at the last bar, so a later call on the next
+    bars continues the same series. Missing entries start from the first value, as pandas does.
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    if not isinstance(presets, PresetSet):
+        presets = PresetSet(presets)
+    triples = presets.triples
+    n, count = len(close), len(triples)
+    if out is None:
+        out = np.empty((n, 2 * count), dtype=np.float64, order='F')
+    columns = [column for pair in zip(presets.columns, presets.signal_columns) for column in pair]
+    if n == 0 or count == 0:
+        return out, columns
+
+    # Presets sharing a fast/slow span reuse one EMA
+    spans = presets.spans
+    if state is None:
+        emas = ema_block(close, spans)
+    else:
+        emas = ema_block(close, spans, init=[state.get(f'ema_{span}') for span in spans])
+        state.update((f'ema_{span}', float(emas[-1, k])) for k, span in enumerate(spans))
+    for k, (fast, slow, signal) in enumerate(triples):
+        np.subtract(emas[:, spans.index(fast)], emas[:, spans.index(slow)], out=out[:, 2 * k])
+        alpha = 2.0 / (signal + 1.0)
+        init = out[0, 2 * k] if state is None else state.get(columns[2 * k + 1], out[0, 2 * k])
+        out[:, 2 * k + 1] = _linear_filter(out[:, 2 * k], 1.0 - alpha, alpha, init)
+        if state is not None:
+            state[columns[2 * k + 1]] = float(out[-1, 2 * k + 1])
+    return out, columns
+
+
+def ema_block(values, spans, adjust=False, out=None, init=None):
+    """
+    Exponential moving averages for several spans at once.
+    values: (n,) series shared by every span, or (n, k) with one column per span.
+    Returns a column-major float64 (n, k) block matching
+    pandas ewm(span=span, adjust=adjust).mean() (no NaN input).
+    init: adjust=False only, per-span EMA value before values[0] (None entries start from
+    values[0]) to continue an earlier series.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if out is None:
+        out = np.empty((n, len(spans)), dtype=np.float64, order='F')
+    if n == 0:
+        return out
+    if adjust:
+        steps = np.arange(1, n + 1, dtype=np.float64)
+    for k, span in enumerate(spans):
+        column = values if values.ndim == 1 else np.ascontiguousarray(values[:, k])
+        alpha = 2.0 / (span + 1.0)
+        if not adjust:
+            start = column[0] if init is None or init[k] is None else init[k]
+            out[:, k] = _linear_filter(column, 1.0 - alpha, alpha, start)
+        else:
+            # adjust=True is a weighted mean: sum(decay**i * x[t-i]) / sum(decay**i)
+            numerator = _linear_filter(column, 1.0 - alpha, 1.0, 0.0)
+            out[:, k] = numerator * alpha / -np.expm1(steps * np.log1p(-alpha))
+    return out
+
+
+def resolve_preset(preset):
+    if isinstance(preset, str):
+        if preset not in MACD_PRESETS:
+            options = ", ".join(f"'{name}'" for name in MACD_PRESETS)
+            raise ValueError(f"Invalid macd_cols value: '{preset}'. Please choose one of the following options: {options}.")
+        return MACD_PRESETS[preset]
+    fast, slow, signal = (int(value) for value in preset)
+    if min(fast, slow, signal) < 1:
+        raise ValueError(f"Invalid MACD preset {preset}: fast, slow and signal must be positive integers.")
+    return fast, slow, signal
+
+
+def preset_columns(preset):
+    """
+    ('macd_f_s_g', 'macdS_f_s_g') column names of a preset name or triple, resolved once.
+    """
+    key = preset if isinstance(preset, str) else resolve_preset(preset)
+    if key not in _columns:
+        fast, slow, signal = resolve_preset(key)
+        _columns[key] = (f'macd_{fast}_{slow}_{signal}', f'macdS_{fast}_{slow}_{signal}')
+    return _columns[key]
+
+
+def add_macds(df, presets=("low2", "low1", "def", "high")):
+    """
+    Returns df with the macd/macdS columns of every preset appended as one block.
+    """
+    block, columns = macd_block(df['close'].to_numpy(dtype=np.float64), presets)
+    return _append_block(df, block, columns)
+
+
+def add_emas(df, periods, adjust=True, apply_to='close', decimals=None):
+    """
+    Returns df with one 'MA_<period>' EMA column per period appended as one block.
+    """
+    block = ema_block(df[apply_to].to_numpy(dtype=np.float64), periods, adjust=adjust)
+    if decimals is not None:
+        np.round(block, decimals, out=block)
+    return _append_block(df, block, [f'MA_{period}' for period in periods])
+
+
+def _append_block(df, block, columns):
+    import pandas as pd
+
+    existing = [column for column in columns if column in df.columns]
+    if existing:
+        df = df.drop(columns=existing)
+    return pd.concat([df, pd.DataFrame(block, index=df.index, columns=columns, copy=False)], axis=1)
+
+
+def _linear_filter(x, decay, gain, init, block=32):
+    """
+    y[t] = decay * y[t-1] + gain * x[t] with y[-1] = init, for a 1-D float64 x.
+
+    Works in blocks: the response inside every block is one matmul with a lower-triangular
+    decay matrix, and the state carried between blocks is the same recurrence on block ends
+    (decay**block), solved recursively before that matmul.
+    """
+    n = len(x)
+    if n <= block:
+        out = np.empty(n, dtype=np.float64)
+        state = init
+        for t in range(n):
+            state = decay * state + gain * x[t]
+            out[t] = state
+        return out
+
+    blocks = -(-n // block)
+    full = (blocks - 1) * block
+    lags = np.arange(block)
+    lag = lags[None, :] - lags[:, None]                       # (input i, output j): j - i
+    weights = np.where(lag >= 0, gain * decay ** np.maximum(lag, 0), 0.0)
+
+    # Block inputs plus one extra slot for the state entering the block
+    rows = np.zeros((blocks, block + 1), dtype=np.float64)
+    rows[:-1, :block] = x[:full].reshape(blocks - 1, block)
+    rows[-1, :n - full] = x[full:]
+    matrix = np.vstack([weights, decay ** (lags + 1)])
+
+    ends = _linear_filter(rows[:, :block] @ weights[:, -1], decay ** block, 1.0, init, block)
+    rows[0, block] = init
+    rows[1:, block] = ends[:-1]
+    return (rows @ matrix).reshape(blocks * block)[:n]
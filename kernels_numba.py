@@ -0,0 +1,87 @@
+"""
+Numba versions of the divergence_detector kernels, selected with
+divergence_detector.set_backend("numba"). Each one is a plain loop over the raw arrays with
+the same results as its NumPy counterpart. Compiled code is cached on disk (cache=True), so
+pool workers reuse it instead of paying the JIT cost again.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def macd_zones(high, low, macd):
+    """
+    _macd_zones: starts, range_extreme, macd_extreme, extreme_pos, oldest zone first.
+    """
+    n = len(macd)
+    count = 0
+    for i in range(n):
+        if i == 0 or (macd[i] >= 0) != (macd[i - 1] >= 0):
+            count += 1
+    starts = np.empty(count, dtype=np.int64)
+    range_extreme = np.empty(count, dtype=np.float64)
+    macd_extreme = np.empty(count, dtype=np.float64)
+    extreme_pos = np.empty(count, dtype=np.int64)
+
+    zone = -1
+    positive = False
+    best_price = np.nan
+    best_macd = np.nan
+    for i in range(n):
+        current = macd[i] >= 0
+        if i == 0 or current != positive:
+            if zone >= 0:
+                range_extreme[zone] = best_price
+                macd_extreme[zone] = best_macd
+            zone += 1
+            positive = current
+            starts[zone] = i
+            extreme_pos[zone] = -1
+            best_price = np.nan
+            best_macd = np.nan
+        # First occurrence wins; NaN never replaces a value
+        price = high[i] if positive else low[i]
+        if price == price and (best_price != best_price or (price > best_price if positive else price < best_price)):
+            best_price = price
+            extreme_pos[zone] = i
+        value = macd[i]
+        if value == value and (best_macd != best_macd or (value > best_macd if positive else value < best_macd)):
+            best_macd = value
+    if zone >= 0:
+        range_extreme[zone] = best_price
+        macd_extreme[zone] = best_macd
+    return starts, range_extreme, macd_extreme, extreme_pos
+
+
+@njit(cache=True)
+def recent_zones_start(macd, limit_zones):
+    """
+    _recent_zones_start: first bar of zone number limit_zones counted from the newest bar.
+    """
+    zones = int(np.floor(limit_zones))
+    if zones < 1:
+        return 0
+    count = 0
+    for i in range(len(macd) - 1, 0, -1):
+        if (macd[i] >= 0) != (macd[i - 1] >= 0):
+            count += 1
+            if count == zones:
+                return i
+    return 0
+
+
+@njit(cache=True)
+def shifted_extremes(macd, m):
+    """
+    _shifted_extremes: peak / trough masks for the centres macd[m:len - m].
+    """
+    n = len(macd) - 2 * m
+    peak = np.zeros(n, dtype=np.bool_)
+    trough = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        center, left, right = macd[i + m], macd[i], macd[i + 2 * m]
+        if center > left and center > right:
+            peak[i] = True
+        elif center < left and center < right:
+            trough[i] = True
+    return peak, trough
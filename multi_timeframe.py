@@ -0,0 +1,124 @@
+import numpy as np
+
+from divergence_detector import (
+    BarArrays, _confirmation_flags, _macd_column, _macd_zones, _ns, _zones_arrays, evaluate_divergence,
+)
+
+
+class MultiTimeframeContext:
+    """
+    Several timeframes of one symbol with a shared time axis for "as of T" questions.
+
+    frames: {timeframe: DataFrame or BarArrays}, higher timeframe first, e.g.
+    {'M30': m30_df, 'M15': m15_df, 'M5': m5_df}, each with 'time', OHLC and the MACD columns.
+    The as-of view of a timeframe is a binary search on its time column, not a boolean mask.
+    Each (timeframe, preset) is segmented once over its full history on first use; the zones
+    as of T are the zones started by T, with only the last one re-reduced up to T, so every
+    query matches calculate_macd_ranges on the frame cut at T.
+
+    presets: the presets every timeframe is checked with (names, (fast, slow, signal) triples
+    or a PresetSet); their 'macd_*' columns must be present in every frame.
+    """
+
+    def __init__(self, frames, presets=('def', 'low1'), limit_zones=7):
+        self.presets = tuple(presets)
+        self.limit_zones = limit_zones
+        self.bars = {}
+        for timeframe, df in frames.items():
+            if not isinstance(df, BarArrays):
+                df = BarArrays.from_frame(df)
+            self.bars[timeframe] = df
+        self._segments = {}
+        self._results = {}
+
+    @property
+    def timeframes(self):
+        return list(self.bars)
+
+    def position(self, timeframe, time=None):
+        """
+        Number of bars of timeframe with time <= T (all bars when time is None).
+        """
+        bars = self.bars[timeframe]
+        if time is None:
+            return len(bars)
+        return int(np.searchsorted(bars.time, _ns(time), side='right'))
+
+    def as_of(self, timeframe, time=None):
+        """
+        BarArrays view of the bars closed by T.
+        """
+        return self.bars[timeframe][:self.position(timeframe, time)]
+
+    def zones(self, timeframe, macd_cols='def', time=None):
+        """
+        calculate_macd_ranges(as_of(timeframe, time), macd_cols, limit_zones) as Zones.
+        """
+        bars = self.bars[timeframe]
+        macd_col = _macd_column(macd_cols)
+        end = self.position(timeframe, time)
+        starts, range_extreme, macd_extreme, extreme_pos = self._segmentation(timeframe, macd_col)
+
+        count = int(np.searchsorted(starts, end, side='left'))
+        first = max(count - int(np.floor(self.limit_zones)), 0)
+        starts, range_extreme, macd_extreme, extreme_pos = (
+            starts[first:count], range_extreme[first:count].copy(), macd_extreme[first:count].copy(),
+            extreme_pos[first:count].copy(),
+        )
+        if count and end < self._zone_end(timeframe, macd_col, count - 1):
+            # The zone open at T only covers the bars up to T
+            start = starts[-1]
+            _, last_range, last_macd, last_pos = _macd_zones(
+                bars.high[start:end], bars.low[start:end], bars.macd[macd_col][start:end],
+            )
+            range_extreme[-1], macd_extreme[-1] = last_range[0], last_macd[0]
+            extreme_pos[-1] = last_pos[0] + start if last_pos[0] >= 0 else -1
+        return _zones_arrays(bars.time, starts, range_extreme, macd_extreme, extreme_pos, self.limit_zones)
+
+    def evaluate(self, timeframe, check_for="Bearish_Divergence", macd_cols='def', time=None):
+        """
+        DivergenceResult of check_divergence on the timeframe as of T. Results are memoized per
+        (timeframe, preset, check_for, bar count), so overlapping confirmations share them.
+        """
+        key = (timeframe, macd_cols, check_for, self.position(timeframe, time))
+        if key not in self._results:
+            if len(self._results) >= 4096:
+                self._results.clear()
+            self._results[key] = evaluate_divergence(self.zones(timeframe, macd_cols, time), check_for)
+        return self._results[key]
+
+    def check(self, timeframe, check_for="Bearish_Divergence", macd_cols='def', time=None):
+        """
+        check_divergence(as_of(timeframe, time), check_for, macd_cols) verdict string.
+        """
+        return str(self.evaluate(timeframe, check_for, macd_cols, time))
+
+    def confirm(self, divergence_type="Bearish", time=None, timeframes=None):
+        """
+        check_divergence_conditions across timeframes (default: all) as of T: True if any
+        timeframe / preset shows the confirming divergence. confirm(kind, t, ('M30', 'M15'))
+        equals check_divergence_conditions(as_of('M30', t), as_of('M15', t), kind).
+        """
+        check_for = f"{divergence_type}_Divergence"
+        expected_flags = _confirmation_flags(divergence_type)
+        for timeframe in (self.timeframes if timeframes is None else timeframes):
+            for macd_cols in self.presets:
+                if self.evaluate(timeframe, check_for, macd_cols, time).flags in expected_flags:
+                    return True
+        return False
+
+    def _segmentation(self, timeframe, macd_col):
+        key = (timeframe, macd_col)
+        if key not in self._segments:
+            bars = self.bars[timeframe]
+            if len(bars) == 0:
+                empty = np.empty(0, dtype=np.int64)
+                self._segments[key] = (empty, np.empty(0), np.empty(0), empty)
+            else:
+                self._segments[key] = _macd_zones(bars.high, bars.low, bars.macd[macd_col])
+        return self._segments[key]
+
+    def _zone_end(self, timeframe, macd_col, zone):
+        starts = self._segments[timeframe, macd_col][0]
+        return starts[zone + 1] if zone + 1 < len(starts) else len(self.bars[timeframe])
+
@@ -0,0 +1,166 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from divergence_detector import BarArrays, check_divergence_conditions
+from indicators import macd_block
+
+RESULT_COLUMNS = ['symbol', 'timeframe', 'lower_timeframe', 'divergence_type', 'signal']
+
+
+class Feed(ABC):
+    """
+    Bar source for run_pipeline. fetch returns the newest `count` bars of one symbol /
+    timeframe as a DataFrame with 'time', 'open', 'high', 'low' and 'close'.
+    """
+
+    @abstractmethod
+    async def fetch(self, symbol, timeframe, count):
+        pass
+
+    def close(self):
+        pass
+
+
+class MT5Feed(Feed):
+    """
+    MetaTrader 5 terminal feed. The blocking copy_rates_from_pos calls run on a small thread
+    pool so several symbols / timeframes are in flight at once.
+    timeframe: 'M30', 'H4', ... or an mt5.TIMEFRAME_* constant.
+    Connects with mt5.initialize(**login) when login details are given, otherwise expects an
+    initialized terminal.
+    """
+
+    def __init__(self, max_workers=4, **login):
+        import MetaTrader5 as mt5
+
+        self.mt5 = mt5
+        if login and not mt5.initialize(**login):
+            raise RuntimeError("Unable to connect to MetaTrader 5")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def fetch(self, symbol, timeframe, count):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetch, symbol, timeframe, count)
+
+    def _fetch(self, symbol, timeframe, count):
+        if isinstance(timeframe, str):
+            timeframe = getattr(self.mt5, f'TIMEFRAME_{timeframe}')
+        rates = self.mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+        if rates is None or len(rates) == 0:
+            raise ValueError(f"Failed to retrieve {symbol} {timeframe} data from MetaTrader 5")
+        df = pd.DataFrame(rates)
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        return df[['time', 'open', 'high', 'low', 'close']]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.mt5.shutdown()
+
+
+class ReplayFeed(Feed):
+    """
+    Local stand-in for a live feed, for tests and replays.
+    frames: {symbol: {timeframe: DataFrame}}. Only bars with time <= end_time are served
+    (move end_time forward to replay bar closes). latency: seconds per fetch, a single value or
+    {timeframe: seconds}, to mimic the terminal round trip.
+    """
+
+    def __init__(self, frames, latency=0.0, end_time=None):
+        self.frames = frames
+        self.latency = latency
+        self.end_time = end_time
+
+    @classmethod
+    def from_csv(cls, root, latency=0.0, end_time=None):
+        """
+        Loads every <symbol>_<timeframe>.csv in root (a 'time' column plus OHLC).
+        """
+        frames = {}
+        for name in sorted(os.listdir(root)):
+            stem, extension = os.path.splitext(name)
+            if extension != '.csv' or '_' not in stem:
+                continue
+            symbol, timeframe = stem.rsplit('_', 1)
+            df = pd.read_csv(os.path.join(root, name), parse_dates=['time'])
+            frames.setdefault(symbol, {})[timeframe] = df
+        return cls(frames, latency, end_time)
+
+    async def fetch(self, symbol, timeframe, count):
+        latency = self.latency.get(timeframe, 0.0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+        df = self.frames[symbol][timeframe]
+        if self.end_time is not None:
+            df = df.iloc[:int(np.searchsorted(df['time'].to_numpy(), np.datetime64(self.end_time), side='right'))]
+        return df.iloc[-count:]
+
+
+async def run_pipeline(feed, symbols, pairs=(('M30', 'M15'), ('M15', 'M5')), counts=None,
+                       divergence_type="Bearish", max_fetches=8, detectors=2, executor=None,
+                       presets=("low2", "low1", "def", "high")):
+    """
+    Fetches every symbol x timeframe concurrently (at most max_fetches at a time), computes the
+    MACD columns and runs check_divergence_conditions(higher, lower, divergence_type) for every
+    (higher, lower) timeframe pair, like examples/app.py does for M30/M15 and M15/M5.
+
+    Each pair is queued for the detector workers as soon as its two timeframes are in, and the
+    CPU-bound work runs on executor (default: the loop's thread pool; a ProcessPoolExecutor
+    works too), so the time after a bar close is bounded by the slowest fetch, not their sum.
+    counts: bars per timeframe, e.g. {'M30': 2000, 'M15': 3500, 'M5': 5000} (default 5000).
+    Returns one row per symbol x pair with the boolean signal.
+    """
+    loop = asyncio.get_running_loop()
+    timeframes = list(dict.fromkeys(timeframe for pair in pairs for timeframe in pair))
+    limit = asyncio.Semaphore(max_fetches)
+    queue = asyncio.Queue()
+    rows = []
+
+    async def load(symbol, timeframe):
+        async with limit:
+            df = await feed.fetch(symbol, timeframe, (counts or {}).get(timeframe, 5000))
+        return await loop.run_in_executor(executor, _prepare, df, presets)
+
+    async def dispatch(symbol, higher, lower):
+        bars = await asyncio.gather(loaded[symbol, higher], loaded[symbol, lower])
+        await queue.put((symbol, higher, lower, *bars))
+
+    async def detect():
+        while True:
+            job = await queue.get()
+            if job is None:
+                return
+            symbol, higher, lower, higher_bars, lower_bars = job
+            signal = await loop.run_in_executor(
+                executor, check_divergence_conditions, higher_bars, lower_bars, divergence_type,
+            )
+            rows.append((symbol, higher, lower, divergence_type, bool(signal)))
+
+    loaded = {
+        (symbol, timeframe): asyncio.ensure_future(load(symbol, timeframe))
+        for symbol in symbols for timeframe in timeframes
+    }
+    workers = [asyncio.ensure_future(detect()) for _ in range(max(detectors, 1))]
+    try:
+        await asyncio.gather(*(dispatch(symbol, higher, lower) for symbol in symbols for higher, lower in pairs))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in (*loaded.values(), *workers):
+            task.cancel()
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def _prepare(df, presets):
+    """
+    DataFrame -> BarArrays carrying the MACD columns of every preset.
+    """
+    bars = BarArrays.from_frame(df, macd_columns=[])
+    block, columns = macd_block(bars.close, presets)
+    bars.macd = {column: block[:, k] for k, column in enumerate(columns)}
+    return bars
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+
+from divergence_detector import (
+    _evaluate_divergence, _float_column, _macd_column, _recent_zones, _recent_zones_start, _time_values,
+    get_backend, set_backend,
+)
+
+RESULT_COLUMNS = ['symbol', 'timeframe', 'preset', 'flags', 'verdict', 'newer_extreme_time', 'older_extreme_time']
+
+
+def scan_universe(frames, presets=('def', 'low1'), timeframes=None, workers=None,
+                  check_for="Bearish_Divergence", limit_zones=7, executor=None):
+    """
+    Runs the check_divergence verdict for every symbol x timeframe x preset.
+
+    frames: {symbol: {timeframe: DataFrame or BarArrays}} with 'time', 'high', 'low' and the
+    MACD columns.
+    timeframes: only scan these timeframes (default: every timeframe present).
+    workers: process-pool size (default os.cpu_count(); 1 runs in this process).
+    executor: an existing concurrent.futures executor to reuse across bar closes.
+
+    Only the bars covering the newest limit_zones zones are shipped to the workers, as plain
+    NumPy arrays. Returns one row per check with the Divergence flags (int), the legacy
+    verdict string and the times of the two extremes behind the divergence (NaT if none),
+    so results can be filtered with integer ops, e.g. results.flags & Divergence.BEARISH_REGULAR.
+    """
+    tasks = [
+        _build_task(symbol, timeframe, df, presets, check_for, limit_zones)
+        for symbol, by_timeframe in frames.items()
+        for timeframe, df in by_timeframe.items()
+        if timeframes is None or timeframe in timeframes
+    ]
+    workers = os.cpu_count() if workers is None else workers
+
+    if executor is not None:
+        chunks = executor.map(_scan_task, tasks, chunksize=_chunksize(len(tasks), workers))
+    elif workers <= 1 or len(tasks) <= 1:
+        chunks = map(_scan_task, tasks)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Workers use the same kernels as this process (Numba loads them from its disk cache)
+        with ProcessPoolExecutor(max_workers=workers, initializer=set_backend, initargs=(get_backend(),)) as pool:
+            chunks = list(pool.map(_scan_task, tasks, chunksize=_chunksize(len(tasks), workers)))
+
+    import pandas as pd
+
+    rows = [row for chunk in chunks for row in chunk]
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    for column in ('newer_extreme_time', 'older_extreme_time'):
+        results[column] = pd.to_datetime(results[column].astype('int64'), unit='ns').where(results[column] >= 0)
+    return results
+
+
+def _build_task(symbol, timeframe, df, presets, check_for, limit_zones):
+    macds = {preset: _float_column(df, _macd_column(preset)) for preset in presets}
+    first = min((_recent_zones_start(macd, limit_zones) for macd in macds.values()), default=0)
+    return (
+        symbol, timeframe, np.ascontiguousarray(_time_values(df)[first:]),
+        np.ascontiguousarray(_float_column(df, 'high')[first:]),
+        np.ascontiguousarray(_float_column(df, 'low')[first:]),
+        {preset: np.ascontiguousarray(macd[first:]) for preset, macd in macds.items()},
+        check_for, limit_zones,
+    )
+
+
+def _scan_task(task):
+    symbol, timeframe, times, high, low, macds, check_for, limit_zones = task
+    rows = []
+    for preset, macd in macds.items():
+        if len(macd) == 0:
+            rows.append((symbol, timeframe, preset, 0, "No Divergence", -1, -1))
+            continue
+        starts, range_extreme, macd_extreme, extreme_pos = _recent_zones(high, low, macd, limit_zones)
+        # The newest limit_zones zones; a count below 1 keeps none ([-0:] would keep them all)
+        first = len(starts) - min(max(int(np.floor(limit_zones)), 0), len(starts))
+        range_extreme, macd_extreme, extreme_pos = range_extreme[first:], macd_extreme[first:], extreme_pos[first:]
+        # Bar positions stand in for the times so only the two used extremes get converted
+        result = _evaluate_divergence(macd_extreme, range_extreme, check_for, extreme_pos)
+        rows.append((symbol, timeframe, preset, int(result.flags), str(result),
+                     _time_at(times, result.newer_time), _time_at(times, result.older_time)))
+    return rows
+
+
+def _time_at(times, position):
+    if position is None or position < 0:
+        return -1
+    return int(times[position])
+
+
+def _chunksize(tasks, workers):
+    return max(1, tasks // (4 * max(workers, 1)))
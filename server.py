@@ -0,0 +1,392 @@
+"""
+Local signal server: holds the latest zone tables and verdicts of every symbol / timeframe /
+preset in memory and answers queries from them over HTTP and WebSocket on localhost.
+
+    python server.py --symbols GBPUSD EURUSD                    # MetaTrader 5 terminal
+    python server.py --csv data/ --symbols GBPUSD --port 8765   # <symbol>_<timeframe>.csv files
+
+    GET /signal/GBPUSD/M30/def/Bearish_Divergence   one verdict
+    GET /snapshot/GBPUSD/M30                        zone tables and verdicts of every preset
+    GET /snapshots                                  what is held, with versions and bar times
+    GET /metrics                                    request latency and recompute cost
+    GET /ws  or  /ws/GBPUSD/M30                     WebSocket: snapshots pushed when a verdict changes
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from divergence_detector import BarArrays, Instrumentation, calculate_macd_ranges, evaluate_divergence
+from indicators import PresetSet, macd_block
+from pipeline import _prepare
+
+_WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC11B85'
+_STATUS = {200: 'OK', 101: 'Switching Protocols', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class SignalServer:
+    """
+    Cached divergence snapshots per (symbol, timeframe), served on localhost.
+
+    A snapshot is recomputed only when new bars come in: from follow() when the newest bar
+    time of a feed changes (the previous bar closed), or when update() is called directly
+    (e.g. from a TickAggregator 'close' event or after a BarStore append). The JSON answers are
+    encoded at recompute time, so a query is one dict lookup and a socket write. WebSocket
+    subscribers get the new snapshot whenever one of its verdicts changes.
+
+    metrics: an Instrumentation with the 'request', 'recompute' and 'fetch' stages; with
+    stage_metrics it is also installed for the server's lifetime, so the detection stages
+    inside each recompute show up too.
+    presets: names or (fast, slow, signal) triples; a triple is served under
+    '<fast>_<slow>_<signal>' in the /signal and /snapshot answers.
+    """
+
+    def __init__(self, presets=('def', 'low1'), checks=("Bearish_Divergence", "Bullish_Divergence"),
+                 limit_zones=7, host='127.0.0.1', port=8765, executor=None, stage_metrics=False):
+        self.presets = tuple(presets)
+        self.checks = tuple(checks)
+        self.limit_zones = limit_zones
+        self.host = host
+        self.port = port
+        self.executor = executor
+        self.stage_metrics = stage_metrics
+        self.metrics = Instrumentation()
+        self.latencies = deque(maxlen=4096)   # recent request times (seconds) for the quantiles
+        self.dropped = 0
+        self._snapshots = {}   # (symbol, timeframe) -> snapshot dict
+        self._responses = {}   # path -> encoded HTTP response
+        self._subscribers = set()
+        self._bar_times = {}   # (symbol, timeframe) -> newest bar time seen by follow()
+        self._connections = set()
+        self._server = None
+
+    async def start(self):
+        """
+        Starts listening (port=0 picks a free port, stored in self.port).
+        """
+        if self.stage_metrics:
+            self.metrics.__enter__()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._cache('/snapshots', self._index())
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for queue, _ in list(self._subscribers):
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        for _ in range(100):   # up to 1 s for subscribers to send their close frame
+            if not self._subscribers:
+                break
+            await asyncio.sleep(0.01)
+        for writer in list(self._connections):
+            writer.close()
+        if self.stage_metrics:
+            self.metrics.__exit__()
+
+    def snapshot(self, symbol, timeframe):
+        return self._snapshots.get((symbol, timeframe))
+
+    async def update(self, symbol, timeframe, df):
+        """
+        Recomputes the snapshot of symbol / timeframe from df (DataFrame or BarArrays with
+        'time' and OHLC; MACD columns missing are computed) and publishes it.
+        Returns True when a verdict changed.
+        """
+        started = self.metrics.begin()
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(
+            self.executor, _compute, df, self.presets, self.checks, self.limit_zones,
+        )
+        key = (symbol, timeframe)
+        previous = self._snapshots.get(key)
+        snapshot.update(symbol=symbol, timeframe=timeframe,
+                        version=previous['version'] + 1 if previous else 1, computed_at=time.time())
+        self.metrics.record('recompute', started, bars=snapshot['bars'], zones=snapshot.pop('_zones'))
+        self._snapshots[key] = snapshot
+
+        self._cache(f'/snapshot/{symbol}/{timeframe}', snapshot)
+        for preset, entry in snapshot['presets'].items():
+            for check, signal in entry['signals'].items():
+                self._cache(f'/signal/{symbol}/{timeframe}/{preset}/{check}',
+                            dict(signal, symbol=symbol, timeframe=timeframe, preset=preset, check=check,
+                                 bar_time=snapshot['bar_time'], version=snapshot['version']))
+        self._cache('/snapshots', self._index())
+
+        changed = previous is None or _verdicts(previous) != _verdicts(snapshot)
+        if changed:
+            message = json.dumps(snapshot).encode()
+            for queue, wanted in list(self._subscribers):
+                if wanted is None or wanted == key:
+                    try:
+                        queue.put_nowait(message)
+                    except asyncio.QueueFull:
+                        self.dropped += 1
+        return changed
+
+    async def follow(self, feed, symbols, timeframes=('M30', 'M15', 'M5'), counts=None, poll=1.0,
+                     max_fetches=8, iterations=None):
+        """
+        Polls a pipeline.Feed: every `poll` seconds the newest bar of each symbol / timeframe is
+        fetched, and only when its time changed are `counts[timeframe]` bars (default 5000)
+        fetched and the snapshot recomputed. iterations: stop after that many polls.
+        """
+        limit = asyncio.Semaphore(max_fetches)
+
+        async def refresh(symbol, timeframe):
+            async with limit:
+                started = self.metrics.begin()
+                newest = await feed.fetch(symbol, timeframe, 1)
+                self.metrics.record('fetch', started, bars=len(newest))
+                if len(newest) == 0:
+                    return
+                bar_time = newest['time'].iloc[-1]
+                if self._bar_times.get((symbol, timeframe)) == bar_time:
+                    return
+                started = self.metrics.begin()
+                df = await feed.fetch(symbol, timeframe, (counts or {}).get(timeframe, 5000))
+                self.metrics.record('fetch', started, bars=len(df))
+            self._bar_times[symbol, timeframe] = bar_time
+            await self.update(symbol, timeframe, df)
+
+        done = 0
+        while iterations is None or done < iterations:
+            await asyncio.gather(*(refresh(symbol, timeframe) for symbol in symbols for timeframe in timeframes))
+            done += 1
+            if iterations is None or done < iterations:
+                await asyncio.sleep(poll)
+
+    def prometheus(self, prefix='macd_divergence'):
+        """
+        metrics.to_prometheus plus request latency quantiles and cache gauges.
+        """
+        lines = [self.metrics.to_prometheus(prefix).rstrip('\n')]
+        lines += [f'# HELP {prefix}_request_seconds Recent request latency.',
+                  f'# TYPE {prefix}_request_seconds summary']
+        if self.latencies:
+            for quantile, value in zip((0.5, 0.9, 0.99), np.percentile(np.array(self.latencies), [50, 90, 99])):
+                lines.append(f'{prefix}_request_seconds{{quantile="{quantile}"}} {float(value)!r}')
+        lines += [f'# TYPE {prefix}_snapshots gauge', f'{prefix}_snapshots {len(self._snapshots)}',
+                  f'# TYPE {prefix}_subscribers gauge', f'{prefix}_subscribers {len(self._subscribers)}',
+                  f'# TYPE {prefix}_push_dropped_total counter', f'{prefix}_push_dropped_total {self.dropped}']
+        return '\n'.join(lines) + '\n'
+
+    def _cache(self, path, payload):
+        self._responses[path] = _response(200, json.dumps(payload).encode())
+
+    def _index(self):
+        return [{'symbol': symbol, 'timeframe': timeframe, 'version': snapshot['version'],
+                 'bar_time': snapshot['bar_time'], 'computed_at': snapshot['computed_at']}
+                for (symbol, timeframe), snapshot in self._snapshots.items()]
+
+    async def _handle(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                started = self.metrics.begin()
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                parts = request_line.split(' ')
+                if len(parts) != 3:
+                    writer.write(_response(400, b'{"error": "bad request"}', close=True))
+                    return
+                method, path, _ = parts
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if method != 'GET':
+                    writer.write(_response(405, b'{"error": "only GET is supported"}'))
+                elif path == '/ws' or path.startswith('/ws/'):
+                    await self._websocket(path, headers, reader, writer)
+                    return
+                else:
+                    response = self._responses.get(path.split('?', 1)[0])
+                    if response is None and path == '/metrics':
+                        response = _response(200, self.prometheus().encode(), 'text/plain; version=0.0.4')
+                    writer.write(response or _response(404, b'{"error": "not found"}'))
+                self.metrics.record('request', started)
+                self.latencies.append(time.perf_counter() - started[0])
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    return
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _websocket(self, path, headers, reader, writer):
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() != 'websocket' or not key:
+            writer.write(_response(400, b'{"error": "expected a WebSocket upgrade"}', close=True))
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode() + _WEBSOCKET_GUID).digest()).decode()
+        writer.write((f'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        self._connections.discard(writer)   # closed through its queue instead
+        parts = path.strip('/').split('/')
+        wanted = (parts[1], parts[2]) if len(parts) == 3 else None
+
+        queue = asyncio.Queue(maxsize=256)
+        subscriber = (queue, wanted)
+        for snapshot_key, snapshot in self._snapshots.items():
+            if wanted is None or wanted == snapshot_key:
+                queue.put_nowait(json.dumps(snapshot).encode())
+        self._subscribers.add(subscriber)
+        receiving = asyncio.ensure_future(_read_frames(reader, writer))
+        try:
+            while True:
+                getting = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait((getting, receiving), return_when=asyncio.FIRST_COMPLETED)
+                if getting not in done:
+                    getting.cancel()
+                    return
+                message = getting.result()
+                if message is None:
+                    writer.write(_frame(0x8, b''))
+                    return
+                writer.write(_frame(0x1, message))
+                await writer.drain()
+        except ConnectionError:
+            return
+        finally:
+            self._subscribers.discard(subscriber)
+            receiving.cancel()
+
+
+def _compute(df, presets, checks, limit_zones):
+    """
+    Snapshot dict of one frame: the zone table and verdicts of every preset.
+    """
+    presets = PresetSet(presets)
+    if isinstance(df, BarArrays):
+        missing = [k for k, column in enumerate(presets.columns) if column not in df.macd]
+        if missing:
+            block, columns = macd_block(df.close, [presets.triples[k] for k in missing])
+            df = df[:]
+            df.macd.update((column, block[:, k]) for k, column in enumerate(columns))
+        bars = df
+    else:
+        bars = _prepare(df, presets)
+    snapshot = {'bars': len(bars), 'bar_time': _iso(bars.time[-1]) if len(bars) else None, 'presets': {}, '_zones': 0}
+    for preset, triple in zip(presets, presets.triples):
+        zones = calculate_macd_ranges(bars, preset, limit_zones, early_exit=True)
+        snapshot['_zones'] += len(zones)
+        signals = {}
+        for check in checks:
+            result = evaluate_divergence(zones, check)
+            signals[check] = {
+                'verdict': str(result), 'flags': int(result.flags),
+                'newer_time': _iso(result.newer_time), 'older_time': _iso(result.older_time),
+            }
+        # Custom triples are keyed like their columns, e.g. '5_13_4'
+        name = preset if isinstance(preset, str) else '_'.join(map(str, triple))
+        snapshot['presets'][name] = {
+            'zones': [
+                {'range_number': float(number), 'range_extreme': _float(price), 'macd_extreme': _float(macd),
+                 'time_extreme': _iso(extreme), 'start_time': _iso(bars.time[start])}
+                for number, price, macd, extreme, start in zip(
+                    zones.range_number, zones.range_extreme, zones.macd_extreme, zones.time_extreme, zones.start)
+            ],
+            'signals': signals,
+        }
+    return snapshot
+
+
+def _verdicts(snapshot):
+    return {preset: {check: signal['flags'] for check, signal in entry['signals'].items()}
+            for preset, entry in snapshot['presets'].items()}
+
+
+def _iso(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        value = np.int64(value).view('datetime64[ns]')   # int64 epoch ns, NAT included
+    value = np.datetime64(value, 'ns')
+    return None if np.isnat(value) else str(value)
+
+
+def _float(value):
+    return None if value != value else float(value)
+
+
+def _response(status, body, content_type='application/json', close=False):
+    return (f'HTTP/1.1 {status} {_STATUS[status]}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n{"Connection: close" if close else "Connection: keep-alive"}'
+            f'\r\n\r\n').encode() + body
+
+
+def _frame(opcode, payload):
+    """
+    One unmasked, unfragmented server-to-client WebSocket frame.
+    """
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x80 | opcode, length))
+    elif length < 65536:
+        header = bytes((0x80 | opcode, 126)) + length.to_bytes(2, 'big')
+    else:
+        header = bytes((0x80 | opcode, 127)) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+async def _read_frames(reader, writer):
+    """
+    Reads client frames until close: answers pings, ignores data frames.
+    """
+    while True:
+        try:
+            first, second = await reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), 'big')
+            mask = await reader.readexactly(4) if second & 0x80 else b'\0\0\0\0'
+            payload = bytes(byte ^ mask[k % 4] for k, byte in enumerate(await reader.readexactly(length)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        opcode = first & 0x0F
+        if opcode == 0x8:
+            writer.write(_frame(0x8, payload[:2]))
+            return
+        if opcode == 0x9:
+            writer.write(_frame(0xA, payload))
+
+
+async def _main(args):
+    from pipeline import MT5Feed, ReplayFeed
+
+    feed = ReplayFeed.from_csv(args.csv) if args.csv else MT5Feed()
+    server = await SignalServer(args.presets, port=args.port, stage_metrics=True).start()
+    print(f"Serving on http://{server.host}:{server.port}")
+    try:
+        await server.follow(feed, args.symbols, args.timeframes, poll=args.poll)
+    finally:
+        await server.close()
+        feed.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', nargs='+', default=['GBPUSD'])
+    parser.add_argument('--timeframes', nargs='+', default=['M30', 'M15', 'M5'])
+    parser.add_argument('--presets', nargs='+', default=['def', 'low1'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--poll', type=float, default=1.0)
+    parser.add_argument('--csv', help='folder of <symbol>_<timeframe>.csv files instead of MetaTrader 5')
+    asyncio.run(_main(parser.parse_args()))
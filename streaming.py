@@ -0,0 +1,139 @@
+from collections import deque
+
+import numpy as np
+
+from divergence_detector import BarArrays, _evaluate_divergence, _float_column, _macd_column, _recent_zones
+
+
+class StreamingDivergenceDetector:
+    """
+    Incremental check_divergence for one symbol / timeframe / MACD preset.
+
+    Keeps the running extremes of the open zone and a ring buffer of the last limit_zones
+    closed zones, so each update costs the same no matter how much history is behind it.
+    The newest bar is held apart as the live candle: an update with the same time replaces
+    it instead of appending a new bar.
+
+    check_for = ["Bearish_Divergence", "Bullish_Divergence"]
+    macd_cols: a preset name from indicators.MACD_PRESETS or a (fast, slow, signal) triple;
+    warm_up frames and updated bars carry its 'macd_<fast>_<slow>_<signal>' column (bars may
+    use 'macd' instead).
+    """
+
+    def __init__(self, macd_cols='def', limit_zones=7, check_for="Bearish_Divergence"):
+        self.macd_col = _macd_column(macd_cols)
+        self.limit_zones = int(np.floor(limit_zones))
+        self.check_for = check_for
+        self.reset()
+
+    def reset(self):
+        self._closed = deque(maxlen=max(self.limit_zones, 1))
+        self._open = None   # [positive, range_extreme, macd_extreme, time_extreme]
+        self._live = None   # (time, positive, price, macd)
+        self._evaluated = (None, None)   # (zones, result) of the last evaluation
+
+    def warm_up(self, df):
+        """
+        Loads history (DataFrame or BarArrays) in one vectorized pass; the last bar becomes the
+        live bar.
+        """
+        self.reset()
+        if len(df) == 0:
+            return self.verdict()
+        macd = _float_column(df, self.macd_col)
+        high, low = _float_column(df, 'high'), _float_column(df, 'low')
+        times = df.time.view('datetime64[ns]') if isinstance(df, BarArrays) else df['time'].to_numpy()
+        if len(macd) > 1:
+            starts, range_extreme, macd_extreme, extreme_pos = _recent_zones(
+                high[:-1], low[:-1], macd[:-1], self.limit_zones,
+            )
+            zones = [
+                [bool(macd[start] >= 0), range_extreme[k], macd_extreme[k],
+                 times[extreme_pos[k]] if extreme_pos[k] >= 0 else None]
+                for k, start in enumerate(starts)
+            ]
+            self._closed.extend(tuple(zone) for zone in zones[:-1])
+            self._open = zones[-1]
+        return self.update({'time': times[-1], 'high': high[-1], 'low': low[-1], self.macd_col: macd[-1]})
+
+    def update(self, bar):
+        """
+        bar: mapping with 'time', 'high', 'low' and the preset's MACD column (or 'macd').
+        Returns the detect_divergence verdict for all bars seen so far.
+        """
+        self.push(bar)
+        return self.verdict()
+
+    def push(self, bar):
+        """
+        update without evaluating: folds the bar in; call result() when a verdict is needed.
+        """
+        macd = bar[self.macd_col] if self.macd_col in bar else bar['macd']
+        positive = bool(macd >= 0)
+        live = (bar['time'], positive, bar['high'] if positive else bar['low'], macd)
+        if self._live is not None and self._live[0] != live[0]:
+            self._commit(self._live)
+        self._live = live
+
+    def verdict(self):
+        return str(self.result())
+
+    def result(self):
+        """
+        DivergenceResult for all bars seen so far.
+        """
+        zones = self.zones()
+        if zones == self._evaluated[0]:
+            # The live bar left every zone extreme as it was (the common intrabar case)
+            return self._evaluated[1]
+        macd = np.array([zone[2] for zone in zones], dtype=np.float64)
+        price = np.array([zone[1] for zone in zones], dtype=np.float64)
+        result = _evaluate_divergence(macd, price, self.check_for, [zone[3] for zone in zones])
+        self._evaluated = (zones, result)
+        return result
+
+    def zones(self):
+        """
+        The newest limit_zones zones as (positive, range_extreme, macd_extreme, time_extreme),
+        oldest first, with the live bar folded in.
+        """
+        zones = list(self._closed)
+        if self._live is not None:
+            time, positive, price, macd = self._live
+            if self._open is not None and self._open[0] == positive:
+                zones.append(tuple(_merge(list(self._open), price, macd, time)))
+            else:
+                if self._open is not None:
+                    zones.append(tuple(self._open))
+                zones.append((positive, price, macd, time))
+        elif self._open is not None:
+            zones.append(tuple(self._open))
+        return zones[-self.limit_zones:] if self.limit_zones > 0 else []
+
+    def _commit(self, bar):
+        time, positive, price, macd = bar
+        if self._open is not None and self._open[0] == positive:
+            _merge(self._open, price, macd, time)
+            return
+        if self._open is not None:
+            self._closed.append(tuple(self._open))
+        self._open = [positive, price, macd, time]
+
+
+def _merge(zone, price, macd, time):
+    """
+    Folds one bar into a zone in place; ties and NaN keep the older extreme, like idxmax/idxmin.
+    """
+    positive = zone[0]
+    if _beats(price, zone[1], positive):
+        zone[1] = price
+        zone[3] = time
+    if _beats(macd, zone[2], positive):
+        zone[2] = macd
+    return zone
+
+
+def _beats(value, best, positive):
+    if best != best:
+        return value == value
+    return value > best if positive else value < best
@@ -0,0 +1,281 @@
+from time import perf_counter_ns
+
+import numpy as np
+
+from divergence_detector import NAT, BarArrays, _float_column, _ns, _time_values
+from indicators import PresetSet, macd_block
+from streaming import StreamingDivergenceDetector
+
+TIMEFRAME_SECONDS = {'M1': 60, 'M5': 300, 'M15': 900, 'M30': 1800, 'H1': 3600, 'H4': 14400, 'D1': 86400}
+
+
+class CandleEvent:
+    """
+    One divergence check pushed by TickAggregator.
+    kind: 'close' (the candle opened at `time` has closed; result is its final verdict) or
+    'update' (intrabar: the candle opened at `time` is still forming).
+    time / tick_time: int64 epoch ns of the candle open and of the tick that raised the event.
+    """
+    __slots__ = ('kind', 'symbol', 'timeframe', 'preset', 'time', 'result', 'tick_time')
+
+    def __init__(self, kind, symbol, timeframe, preset, time, result, tick_time):
+        self.kind = kind
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.preset = preset
+        self.time = time
+        self.result = result
+        self.tick_time = tick_time
+
+    def __repr__(self):
+        return (f"CandleEvent({self.kind!r}, {self.symbol!r}, {self.timeframe!r}, {self.preset!r}, "
+                f"{np.datetime64(self.time, 'ns')}, {str(self.result)!r})")
+
+
+class TickAggregator:
+    """
+    Builds the forming candles of every symbol / timeframe from ticks and runs the divergence
+    check on them as they form, without rebuilding a DataFrame.
+
+    Candles live in preallocated arrays (capacity bars per symbol / timeframe; the older half
+    is dropped when full). The MACD EMAs of the closed candles are kept as state, so each tick
+    costs one EMA step per span and preset for the forming candle, and the candle is handed to a
+    StreamingDivergenceDetector per preset as its live bar.
+
+    on_tick returns (and passes to each callback) the CandleEvents it raised: a 'close' event
+    per preset when a tick opens the next candle, and an 'update' event per preset for the
+    forming candle (with changes_only, only when its Divergence flags change).
+
+    timeframes: keys of TIMEFRAME_SECONDS.
+    presets: names, (fast, slow, signal) triples or a PresetSet; each gets its own detector,
+    and CandleEvent.preset is the entry as given here.
+    """
+
+    def __init__(self, timeframes=('M5', 'M15', 'M30'), presets=('def', 'low1'),
+                 check_for="Bearish_Divergence", limit_zones=7, capacity=4096, changes_only=True,
+                 callbacks=()):
+        for timeframe in timeframes:
+            if timeframe not in TIMEFRAME_SECONDS:
+                raise ValueError(f"Invalid timeframe: '{timeframe}'. Please choose one of the following options: "
+                                 f"{', '.join(repr(name) for name in TIMEFRAME_SECONDS)}.")
+        self.timeframes = tuple(timeframes)
+        self.presets = presets if isinstance(presets, PresetSet) else PresetSet(presets)
+        self.check_for = check_for
+        self.limit_zones = limit_zones
+        self.capacity = capacity
+        self.changes_only = changes_only
+        self.callbacks = list(callbacks)
+        self._series = {}
+
+    def warm_up(self, symbol, timeframe, df):
+        """
+        Loads candle history (DataFrame or BarArrays with 'time' and OHLC, oldest first). The
+        last candle is taken as the forming one, so ticks inside it keep updating it.
+        """
+        series = self._series[symbol, timeframe] = self._new_series(timeframe)
+        series.load(_time_values(df), *(_float_column(df, name) for name in ('open', 'high', 'low', 'close')))
+
+    def on_tick(self, symbol, time, price):
+        """
+        time: int64 epoch ns or datetime-like; price: the tick price (e.g. bid).
+        Ticks older than the forming candle are ignored.
+        """
+        time, price = _ns(time), float(price)
+        events = []
+        for timeframe in self.timeframes:
+            series = self._series.get((symbol, timeframe))
+            if series is None:
+                series = self._series[symbol, timeframe] = self._new_series(timeframe)
+            closed = series.tick(time, price)
+            if closed is None:
+                continue
+            candle = int(series.time[series.length - 1])
+            for k, preset in enumerate(self.presets):
+                if closed != NAT:
+                    events.append(CandleEvent('close', symbol, timeframe, preset, closed, series.results[k], time))
+                previous = series.results[k]
+                result = series.detectors[k].result()
+                series.results[k] = result
+                if not self.changes_only or previous is None or result.flags != previous.flags:
+                    events.append(CandleEvent('update', symbol, timeframe, preset, candle, result, time))
+        for callback in self.callbacks:
+            for event in events:
+                callback(event)
+        return events
+
+    def bars(self, symbol, timeframe):
+        """
+        BarArrays view of the candles (forming one last) with the 'macd_*' / 'macdS_*' columns.
+        """
+        return self._series[symbol, timeframe].bars()
+
+    def _new_series(self, timeframe):
+        return _CandleSeries(TIMEFRAME_SECONDS[timeframe] * 1_000_000_000, self.presets, self.check_for,
+                             self.limit_zones, self.capacity)
+
+
+class _CandleSeries:
+    """
+    Candle arrays, EMA state and detectors of one symbol / timeframe.
+    """
+
+    def __init__(self, period, presets, check_for, limit_zones, capacity):
+        self.period = period
+        self.presets = presets
+        self.capacity = max(int(capacity), 2)
+        self.time = np.empty(self.capacity, dtype=np.int64)
+        self.ohlc = np.empty((self.capacity, 4), dtype=np.float64, order='F')
+        self.macd = np.empty((self.capacity, 2 * len(presets)), dtype=np.float64, order='F')
+        self.length = 0
+        self.state = {}      # EMA values at the last closed candle, as in macd_block(state=...)
+        self.forming = {}    # the same values with the forming candle folded in
+        self.detectors = [StreamingDivergenceDetector(triple, limit_zones, check_for) for triple in presets.triples]
+        self.results = [None] * len(presets)
+        self.candle = None   # the forming candle as Python values: [time (datetime64), high, low, close]
+        # (state key, alpha) per EMA span and (fast key, slow key, signal key, alpha) per preset
+        self._spans = [(f'ema_{span}', 2.0 / (span + 1.0)) for span in presets.spans]
+        self._lines = [(f'ema_{fast}', f'ema_{slow}', name, 2.0 / (signal + 1.0))
+                       for (fast, slow, signal), name in zip(presets.triples, presets.signal_columns)]
+
+    def load(self, times, open, high, low, close):
+        n = min(len(times), self.capacity // 2)
+        self.state, self.forming = {}, {}
+        if n:
+            # The EMA state runs over the whole history even when only the tail fits
+            block, _ = macd_block(close[:-1], self.presets, state=self.state)
+            self.macd[:n - 1] = block[len(block) - (n - 1):]
+        self.time[:n] = times[len(times) - n:]
+        for k, values in enumerate((open, high, low, close)):
+            self.ohlc[:n, k] = values[len(values) - n:]
+        self.length = n
+        if n:
+            self.candle = [np.datetime64(int(self.time[n - 1]), 'ns'), *map(float, self.ohlc[n - 1, 1:])]
+            self._fold(n - 1)
+        bars = self.bars()
+        for k, detector in enumerate(self.detectors):
+            if n:
+                detector.warm_up(bars)
+                self.results[k] = detector.result()
+            else:
+                detector.reset()
+                self.results[k] = None
+
+    def tick(self, time, price):
+        """
+        Folds one tick in. Returns None for a stale tick, else the open time of the candle it
+        closed (NAT if none).
+        """
+        bucket = time - time % self.period
+        last = self.length - 1
+        closed = NAT
+        candle = self.candle
+        if self.length and bucket == self.time[last]:
+            if price > candle[1]:
+                candle[1] = price
+            if price < candle[2]:
+                candle[2] = price
+            candle[3] = price
+            self.ohlc[last, 1:] = candle[1:]
+        elif self.length and bucket < self.time[last]:
+            return None
+        else:
+            if self.length:
+                closed = int(self.time[last])
+                self.state = dict(self.forming)
+            if self.length == self.capacity:
+                self._shrink()
+            last = self.length
+            self.length += 1
+            self.time[last] = bucket
+            self.ohlc[last] = price
+            self.candle = [np.datetime64(bucket, 'ns'), price, price, price]
+        self._fold(last)
+        return closed
+
+    def bars(self):
+        n = self.length
+        macd = {}
+        for k, (column, signal) in enumerate(zip(self.presets.columns, self.presets.signal_columns)):
+            macd[column], macd[signal] = self.macd[:n, 2 * k], self.macd[:n, 2 * k + 1]
+        return BarArrays(self.time[:n], self.ohlc[:n, 0], self.ohlc[:n, 1], self.ohlc[:n, 2], self.ohlc[:n, 3], macd)
+
+    def _fold(self, row):
+        """
+        One EMA step from the closed-candle state with the forming candle's close (the same
+        recurrence as indicators.macd_block), then the candle goes to the detectors.
+        """
+        time, high, low, close = self.candle
+        state, forming = self.state, self.forming
+        for key, alpha in self._spans:
+            previous = state.get(key)
+            forming[key] = close if previous is None else (1.0 - alpha) * previous + alpha * close
+        values = []
+        for detector, (fast, slow, name, alpha) in zip(self.detectors, self._lines):
+            macd = forming[fast] - forming[slow]
+            previous = state.get(name)
+            forming[name] = macd if previous is None else (1.0 - alpha) * previous + alpha * macd
+            values += (macd, forming[name])
+            detector.push({'time': time, 'high': high, 'low': low, 'macd': macd})
+        self.macd[row] = values
+
+    def _shrink(self):
+        keep = self.capacity // 2
+        self.time[:keep] = self.time[self.length - keep:self.length]
+        self.ohlc[:keep] = self.ohlc[self.length - keep:self.length]
+        self.macd[:keep] = self.macd[self.length - keep:self.length]
+        self.length = keep
+
+
+def replay_ticks(path, aggregator, symbol=None, chunksize=1_000_000):
+    """
+    Feeds recorded ticks from a CSV file through aggregator.on_tick in file order and
+    measures throughput and tick-to-signal latency (on_tick call to its events).
+
+    Columns: 'time_msc' (epoch ms, as exported from mt5.copy_ticks_range) or 'time' (epoch
+    seconds or a datetime string), 'bid' or 'price', and 'symbol' unless symbol is given.
+    Returns a dict with ticks, events, seconds, ticks_per_second and latency_us / signal_latency_us
+    (p50, p99, max over all ticks / over ticks that raised events).
+    """
+    import pandas as pd
+
+    latencies, signal_latencies = [], []
+    ticks = events = 0
+    started = perf_counter_ns()
+    for frame in pd.read_csv(path, chunksize=chunksize):
+        if 'time_msc' in frame.columns:
+            times = frame['time_msc'].to_numpy(dtype=np.int64) * 1_000_000
+        elif np.issubdtype(frame['time'].dtype, np.number):
+            times = (frame['time'].to_numpy(dtype=np.float64) * 1e9).astype(np.int64)
+        else:
+            times = pd.to_datetime(frame['time']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        prices = frame['bid' if 'bid' in frame.columns else 'price'].to_numpy(dtype=np.float64)
+        symbols = frame['symbol'].to_numpy(dtype=object) if symbol is None else [symbol] * len(frame)
+        latency = np.empty(len(frame), dtype=np.int64)
+        raised = np.zeros(len(frame), dtype=bool)
+        on_tick = aggregator.on_tick
+        for i, (name, time, price) in enumerate(zip(symbols, times.tolist(), prices.tolist())):
+            begin = perf_counter_ns()
+            count = len(on_tick(name, time, price))
+            latency[i] = perf_counter_ns() - begin
+            raised[i] = count > 0
+            events += count
+        ticks += len(frame)
+        latencies.append(latency)
+        signal_latencies.append(latency[raised])
+    seconds = (perf_counter_ns() - started) / 1e9
+    return {
+        'ticks': ticks,
+        'events': events,
+        'seconds': seconds,
+        'ticks_per_second': ticks / seconds if seconds else 0.0,
+        'latency_us': _percentiles(latencies),
+        'signal_latency_us': _percentiles(signal_latencies),
+    }
+
+
+def _percentiles(chunks):
+    values = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+    if len(values) == 0:
+        return {'p50': float('nan'), 'p99': float('nan'), 'max': float('nan')}
+    p50, p99 = np.percentile(values, [50, 99]) / 1e3
+    return {'p50': float(p50), 'p99': float(p99), 'max': float(values.max()) / 1e3}